@@ -1,7 +1,8 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, url_for, abort
 from ibm_watson import TextToSpeechV1
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-import os, io
+from tts_cache import KEY_PATTERN, TTSCache, watson_synthesizer
+import os
 app = Flask(__name__)
 
 API_KEY = os.getenv("IBM_TTS_API_KEY")
@@ -13,6 +14,13 @@ authenticator = IAMAuthenticator(API_KEY)
 tts = TextToSpeechV1(authenticator=authenticator)
 tts.set_service_url(SERVICE_URL)
 
+# Shares its cache directory with app.py so either service can serve repeats
+tts_cache = TTSCache(
+    os.getenv("TTS_CACHE_DIR", "tts_cache"),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    synthesizer=watson_synthesizer(lambda: tts),
+)
+
 
 @app.route("/synthesize", methods=["POST"])
 def synthesize():
@@ -24,21 +32,23 @@ def synthesize():
         return jsonify({"error": "Missing or invalid 'text'"}), 400
 
     try:
-        response = tts.synthesize(
-            text,
-            voice=voice,
-            accept="audio/mp3"
-        ).get_result()
-        audio_bytes = response.content
-        return send_file(
-            io.BytesIO(audio_bytes),
-            mimetype="audio/mp3",
-            as_attachment=False,
-            download_name="speech.mp3"
-        )
+        key = tts_cache.get_or_synthesize(text, voice)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    response = cached_audio(key)
+    response.headers["X-Audio-URL"] = url_for("cached_audio", key=key)
+    return response
+
+
+@app.route("/audio/<key>.mp3", methods=["GET"])
+def cached_audio(key):
+    if not KEY_PATTERN.match(key):
+        abort(404)
+    path = tts_cache.get(key)
+    if not path:
+        abort(404)
+    return send_file(path, mimetype="audio/mpeg", conditional=True, etag=key, max_age=86400)
+
 if __name__ == "__main__":
     app.run(debug=True)
-
@@ -3,7 +3,8 @@ from flask import current_app
 from dotenv import load_dotenv
 from flask import (
     Flask, render_template, redirect, url_for,
-    flash, session, request, jsonify, send_file, abort
+    flash, session, request, jsonify, send_file, abort,
+    Response, stream_with_context
 )
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
@@ -12,29 +13,43 @@ from wtforms import (
     SelectField, TextAreaField
 )
 from wtforms.validators import DataRequired, Email, EqualTo, Length
-from deck_database import db, User, Deck, Card, StudyProgress
-import requests
+import db_config
+from deck_database import db, User, Deck, Card, QuizAttempt, StudyProgress, upgrade_schema
+from image_jobs import (ImageJobWorkerPool, deck_media_progress, enqueue_image_job, fake_image_generator,
+                        pending_job_count, prepare_deck_media, queue_missing_images)
+import image_cache
+import image_variants
+from tts_cache import KEY_PATTERN, TTSCache, fake_synthesizer, watson_synthesizer
+import scheduler
+import card_search
+import user_stats
+import quiz_grading
+import http_cache
+import fragment_cache
+import outbound
+import metrics
+import user_cache
+from providers import registry as providers
+from card_import import CardImportError, import_cards, iter_records, iter_rows, text_stream
 import json
-import io
-import base64
-import uuid
 import logging
-from PIL import Image
-from ibm_watson import TextToSpeechV1
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-from google import genai
-from google.genai import types
+import functools
+import signal
+import sys
+import time
+from datetime import datetime, timezone
 
 load_dotenv()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-    "DATABASE_URL", "sqlite:///deck.db"
-)
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# DATABASE_URL, pool sizes and SQLite pragmas (WAL, busy timeout) come from db_config
+db_config.configure_app(app)
+app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # bulk card imports
 
 # Initialize extensions
 db.init_app(app)
+metrics.init_app(app)  # request timing, SQL counters, /metrics
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -42,27 +57,38 @@ login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# TTS Configuration
-IBM_TTS_API_KEY = os.getenv("IBM_TTS_API_KEY")
-IBM_TTS_URL = os.getenv("IBM_TTS_URL")
+    # Served from a short-TTL cache instead of a SELECT on every request
+    return user_cache.load_user(int(user_id))
 
-if IBM_TTS_API_KEY and IBM_TTS_URL:
-    authenticator = IAMAuthenticator(IBM_TTS_API_KEY)
-    tts = TextToSpeechV1(authenticator=authenticator)
-    tts.set_service_url(IBM_TTS_URL)
-else:
-    tts = None
+# TTS Configuration; the Watson SDK is imported on first synthesis (see providers.py)
+if not providers.configured("watson"):
     print("Warning: IBM TTS credentials not found. TTS functionality will be disabled.")
 
-# GenAI Configuration for Image Generation
-GENAI_KEY = os.getenv("GENAI_KEY")
-if GENAI_KEY:
-    genai_client = genai.Client(api_key=GENAI_KEY)
-    logging.basicConfig(level=logging.INFO)
+# Synthesized audio is cached on disk; TTS_SYNTHESIZER=fake uses a local stub
+if os.getenv("TTS_SYNTHESIZER") == "fake":
+    tts_synthesizer = fake_synthesizer
+elif providers.configured("watson"):
+    tts_synthesizer = watson_synthesizer(lambda: providers.get("watson"), outbound.watson)
 else:
-    genai_client = None
+    tts_synthesizer = None
+if tts_synthesizer:
+    tts_synthesizer = metrics.timed("tts_synthesize")(tts_synthesizer)
+
+tts_cache = TTSCache(
+    os.getenv("TTS_CACHE_DIR", "tts_cache"),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    synthesizer=tts_synthesizer,
+)
+
+DEFAULT_VOICE = "en-US_AllisonV3Voice"
+
+def synthesize_card_audio(text):
+    """Synthesize (or reuse) speech for a card term and return its URL"""
+    key = tts_cache.get_or_synthesize(text, DEFAULT_VOICE)
+    return f"/audio/{key}.mp3"
+
+# GenAI Configuration for Image Generation; the client is built on first use
+if not providers.configured("gemini"):
     print("Warning: GENAI_KEY not found. AI image generation will fall back to placeholder images.")
 
 
@@ -136,43 +162,92 @@ def register():
 
 @app.route("/synthesize", methods=["POST"])
 def synthesize():
-    """Text-to-speech endpoint"""
-    if not tts:
-        return jsonify({"error": "TTS service not available"}), 503
-    
+    """Text-to-speech endpoint, served from the on-disk TTS cache when possible"""
     data = request.get_json()
     text = data.get("text")
-    voice = data.get("voice", "en-US_AllisonV3Voice")
+    voice = data.get("voice", DEFAULT_VOICE)
 
     if not text or not isinstance(text, str):
         return jsonify({"error": "Missing or invalid 'text'"}), 400
 
+    key = tts_cache.key(text, voice)
+    if not tts_cache.get(key) and not tts_cache.synthesizer:
+        return jsonify({"error": "TTS service not available"}), 503
+
     try:
-        response = tts.synthesize(
-            text,
-            voice=voice,
-            accept="audio/mp3"
-        ).get_result()
-        audio_bytes = response.content
-        return send_file(
-            io.BytesIO(audio_bytes),
-            mimetype="audio/mp3",
-            as_attachment=False,
-            download_name="speech.mp3"
-        )
+        key = tts_cache.get_or_synthesize(text, voice)
+    except outbound.ProviderUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def generate_image_for_term(term, definition):
-    """Generate a contextual image using Google Gemini AI or fallback to placeholders"""
+    audio_url = url_for("cached_audio", key=key)
+
+    # Remember the term's audio on the card so later plays skip /synthesize
+    card_id = data.get("card_id")
+    if card_id and current_user.is_authenticated:
+        card = Card.query.join(Deck).filter(
+            Card.id == card_id,
+            Deck.owner_id == current_user.id
+        ).first()
+        if card and card.term == text and card.audio_url != audio_url:
+            card.audio_url = audio_url
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+    response = cached_audio(key)
+    response.headers["X-Audio-URL"] = audio_url
+    return response
+
+@app.route("/audio/<key>.mp3", methods=["GET"])
+def cached_audio(key):
+    """Serve cached speech with ETag and Range support"""
+    if not KEY_PATTERN.match(key):
+        abort(404)
+    path = tts_cache.get(key)
+    if not path:
+        abort(404)
+    return send_file(
+        path,
+        mimetype="audio/mpeg",
+        conditional=True,
+        etag=key,
+        max_age=86400
+    )
+
+def build_image_prompt(term, definition):
+    """Gemini prompt for a card illustration"""
+    term = " ".join(term.split())
+    definition = " ".join(definition.split())
+    return f"Create an educational illustration that visually represents the concept of '{term}' (which means: {definition}). The image should be clear, visually appealing, and help students understand the concept through visual representation only. IMPORTANT: Do not include any text, words, letters, or written definitions in the image. Use only visual elements, symbols, diagrams, or illustrations to convey the meaning. Style: educational, clean, professional illustration suitable for learning materials, no text overlay."
+
+@metrics.timed("generate_image")
+def generate_image_for_term(term, definition, fallback=True):
+    """Generate a contextual image using Google Gemini AI or fallback to placeholders
+
+    Image jobs pass fallback=False: an open circuit or a transient error is
+    raised instead, so the job is retried later and only gets a placeholder
+    once it runs out of attempts.
+    """
     
-    if genai_client:
+    prompt = build_image_prompt(term, definition)
+
+    # Reuse an image already generated for the same term/definition
+    cached_url = image_cache.lookup(prompt)
+    if cached_url:
+        return cached_url
+
+    # While Gemini's circuit is open, go straight to the placeholders
+    if providers.configured("gemini") and not fallback and not outbound.gemini.available():
+        raise outbound.ProviderUnavailable("gemini circuit is open")
+    if providers.configured("gemini") and outbound.gemini.available():
         try:
-            # Create a detailed prompt combining term and definition
-            prompt = f"Create an educational illustration that visually represents the concept of '{term}' (which means: {definition}). The image should be clear, visually appealing, and help students understand the concept through visual representation only. IMPORTANT: Do not include any text, words, letters, or written definitions in the image. Use only visual elements, symbols, diagrams, or illustrations to convey the meaning. Style: educational, clean, professional illustration suitable for learning materials, no text overlay."
-            
+            from google.genai import types
             # Generate image using Gemini AI
-            resp = genai_client.models.generate_content(
+            resp = outbound.gemini.call(
+                providers.get("gemini").models.generate_content,
                 model="gemini-2.0-flash-preview-image-generation",
                 contents=prompt,
                 config=types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"])
@@ -182,25 +257,23 @@ def generate_image_for_term(term, definition):
             part = next(p for p in resp.candidates[0].content.parts if p.inline_data)
             img_data = part.inline_data.data
             
-            # Save image to static folder with unique name
-            filename = f"generated_{uuid.uuid4().hex[:8]}.png"
-            filepath = os.path.join("static", "images", filename)
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            
-            # Save the image
-            with open(filepath, "wb") as f:
-                f.write(img_data)
-            
-            # Return the URL path
-            return f"/static/images/{filename}"
+            # Save the image (deduplicated by content) and return its URL path
+            return image_cache.store(prompt, img_data)
             
+        except outbound.ProviderUnavailable as e:
+            if not fallback:
+                raise
+            logging.info(f"Skipping AI image for term '{term}': {e}")
         except Exception as e:
+            if not fallback and outbound.is_transient(e):
+                raise
             logging.error(f"AI image generation failed for term '{term}': {e}")
             # Fall through to fallback
     
-    # Fallback to high-quality placeholder images if AI generation fails
+    return placeholder_image_for_term(term)
+
+def placeholder_image_for_term(term, definition=None):
+    """High-quality placeholder image for when AI generation isn't available"""
     fallback_images = {
         # Biology terms
         "mitochondria": "https://picsum.photos/600/400?random=101",
@@ -248,6 +321,56 @@ def generate_image_for_term(term, definition):
     
     return f"https://picsum.photos/600/400?random={random_id}"
 
+# Background image generation workers.
+# IMAGE_GENERATOR=fake swaps Gemini for a local stub (handy for development).
+if os.getenv("IMAGE_GENERATOR") == "fake":
+    image_generator = functools.partial(
+        fake_image_generator, delay=float(os.getenv("FAKE_IMAGE_DELAY", "0"))
+    )
+else:
+    image_generator = functools.partial(generate_image_for_term, fallback=False)
+
+image_workers = ImageJobWorkerPool(
+    app,
+    image_generator,
+    fallback=placeholder_image_for_term,
+    num_workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    post_processor=image_variants.variants_for_url,
+    audio_generator=synthesize_card_audio if tts_synthesizer else None,
+)
+
+@app.cli.command("transcode-images")
+def transcode_images_command():
+    """Build WebP/AVIF variants for cards whose images predate the pipeline"""
+    cards = Card.query.filter(
+        Card.image_url.like(image_variants.STATIC_IMAGE_PREFIX + "%"),
+        Card.image_variants.is_(None)
+    ).all()
+    for card in cards:
+        variants = image_variants.variants_for_url(card.image_url)
+        if variants:
+            card.image_variants = json.dumps(variants)
+    db.session.commit()
+    print(f"Transcoded images for {len(cards)} card(s).")
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create tables, upgrade the schema and build the search index"""
+    init_db()
+    print("Database is up to date.")
+
+@app.cli.command("image-worker")
+def image_worker_command():
+    """Run image generation workers in their own process"""
+    image_workers.start()
+    print(f"Image workers running ({image_workers.num_workers} threads), "
+          f"{pending_job_count()} job(s) queued. Ctrl+C to stop.")
+    try:
+        while image_workers.running:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        image_workers.stop()
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
@@ -257,6 +380,12 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data.lower()).first()
         if user and user.check_password(form.password.data):
+            # Move the stored hash to the current PASSWORD_HASH_METHOD while we have the password
+            if user.rehash_password(form.password.data):
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
             login_user(user)
             flash("Logged in successfully!", "success")
             
@@ -281,13 +410,34 @@ def index():
         return redirect(url_for('home'))
     return redirect(url_for('login'))
 
+def deck_summaries(user_id, version=None):
+    """User's decks with card counts and mastery (one aggregated query, then cached)
+
+    version is Deck.list_version(user_id), if the caller already has it.
+    """
+    if version is None:
+        version = Deck.list_version(user_id)
+    return fragment_cache.cache.get_or_compute(
+        fragment_cache.user_scope(user_id), "deck_summaries", lambda: Deck.summaries(user_id),
+        version=tuple(version)
+    )
+
 @app.route("/home")
 @login_required
 def home():
-    # Get user's decks from database
-    decks = current_user.decks.all()
-    deck_data = [deck.to_dict(current_user.id) for deck in decks]
-    return render_template("home.html", decks=deck_data, user=current_user)
+    version = Deck.list_version(current_user.id)
+
+    def render():
+        return render_template("home.html", decks=deck_summaries(current_user.id, version), user=current_user)
+
+    # The header greets the user by name/email, so a profile change must change the ETag too
+    etag = http_cache.make_etag("home", current_user.id, current_user.name, current_user.email, *version)
+    return http_cache.conditional(etag, render)
+
+@app.route("/api/decks", methods=["GET"])
+@login_required
+def api_list_decks():
+    return jsonify({"decks": deck_summaries(current_user.id)})
 
 
 
@@ -313,20 +463,18 @@ def create_card_global():
             flash("Invalid deck selection.", "danger")
             return render_template("create_card.html", form=form)
 
-        # Generate image for the card
-        image_url = generate_image_for_term(form.term.data, form.definition.data)
-
-        # Create new card
+        # Create new card; its image is generated in the background
         card = Card(
             term=form.term.data,
             definition=form.definition.data,
-            image_url=image_url,
             deck_id=deck.id
         )
 
         try:
             db.session.add(card)
+            enqueue_image_job(card)
             db.session.commit()
+            image_workers.notify()
             flash(f"Added '{card.term}' to {deck.name}", "success")
             return redirect(url_for("study_deck", deck_id=deck.id))
         except Exception as e:
@@ -349,20 +497,18 @@ def create_card_for_deck(deck_id):
     form.deck_id.data = deck.id
 
     if form.validate_on_submit():
-        # Generate image for the new card
-        image_url = generate_image_for_term(form.term.data, form.definition.data)
-        
-        # Create new card
+        # Create new card; its image is generated in the background
         card = Card(
             term=form.term.data,
             definition=form.definition.data,
-            image_url=image_url,
             deck_id=deck.id
         )
 
         try:
             db.session.add(card)
+            enqueue_image_job(card)
             db.session.commit()
+            image_workers.notify()
             flash(f"Added '{card.term}' to {deck.name}", "success")
             return redirect(url_for("study_deck", deck_id=deck.id))
         except Exception as e:
@@ -373,57 +519,116 @@ def create_card_for_deck(deck_id):
 
 
 
+CARD_WINDOW = 50
+
+def cards_for_display(deck):
+    """First window of card dicts for the study/quiz pages, plus the cursor for the next one
+
+    Missing images are queued for background generation rather than generated inline.
+    """
+    missing = deck.cards.filter(
+        Card.image_url.is_(None),
+        db.or_(Card.image_status.is_(None), Card.image_status.notin_(["pending", "failed"]))
+    ).all()
+    if queue_missing_images(missing):
+        try:
+            db.session.commit()
+            image_workers.notify()
+        except Exception:
+            db.session.rollback()
+
+    return card_window(deck, None, CARD_WINDOW)
+
+def card_window(deck, after, limit, fields=Card.FIELDS):
+    """(card dicts, next cursor) for one keyset window, served from the fragment cache
+
+    Any card change touches deck.updated_at (see bump_deck_versions), so it versions the window.
+    """
+    def compute():
+        rows = Card.keyset_query(deck.id, after, fields).limit(limit + 1).all()
+        cards = [Card.row_to_dict(row, fields) for row in rows[:limit]]
+        return {"cards": cards, "next_cursor": cards[-1]["id"] if len(rows) > limit else None}
+
+    window = fragment_cache.cache.get_or_compute(
+        fragment_cache.deck_scope(deck.id), f"cards:{after}:{limit}:{','.join(fields)}", compute,
+        cost=limit, version=(deck.updated_at,)
+    )
+    return window["cards"], window["next_cursor"]
+
 @app.route("/decks/<int:deck_id>/study", methods=["GET"])
 @login_required
 def study_deck(deck_id):
-    # Get the deck and verify ownership
-    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first_or_404()
-    
-    # Get all cards for this deck
-    cards = deck.cards.all()
-    
-    # Convert cards to dict format for the template
-    cards_data = []
-    for card in cards:
-        card_dict = card.to_dict()
-        # Generate image if not present
-        if not card_dict['image_url']:
-            card_dict['image_url'] = generate_image_for_term(card.term, card.definition)
-            # Update the database with the generated image
-            card.image_url = card_dict['image_url']
-            try:
-                db.session.commit()
-            except:
-                db.session.rollback()
-        cards_data.append(card_dict)
-    
-    return render_template("study.html", deck=deck.to_dict(current_user.id), cards=cards_data)
+    # Verify ownership and get the deck's version without loading it
+    version = Deck.page_version(deck_id, current_user.id)
+    if version is None:
+        abort(404)
+
+    def render():
+        deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first_or_404()
+        # Pages render the first window straight away and fetch the rest from /api/decks/<id>/cards
+        cards_data, next_cursor = cards_for_display(deck)
+        return render_template("study.html", deck=deck.to_dict(current_user.id),
+                               cards=cards_data, next_cursor=next_cursor, card_window=CARD_WINDOW)
+
+    return http_cache.conditional(http_cache.make_etag("study", deck_id, CARD_WINDOW, *version), render)
 
 @app.route("/decks/<int:deck_id>/quiz", methods=["GET"])
 @login_required
 def quiz_deck(deck_id):
-    # Get the deck and verify ownership
-    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first_or_404()
-    
-    # Get all cards for this deck
-    cards = deck.cards.all()
-    
-    # Convert cards to dict format for the template
-    cards_data = []
-    for card in cards:
-        card_dict = card.to_dict()
-        # Generate image if not present
-        if not card_dict['image_url']:
-            card_dict['image_url'] = generate_image_for_term(card.term, card.definition)
-            # Update the database with the generated image
-            card.image_url = card_dict['image_url']
-            try:
-                db.session.commit()
-            except:
-                db.session.rollback()
-        cards_data.append(card_dict)
-    
-    return render_template("quiz.html", deck=deck.to_dict(current_user.id), cards=cards_data)
+    # Verify ownership and get the deck's version without loading it
+    version = Deck.page_version(deck_id, current_user.id)
+    if version is None:
+        abort(404)
+
+    def render():
+        deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first_or_404()
+        # Pages render the first window straight away and fetch the rest from /api/decks/<id>/cards
+        cards_data, next_cursor = cards_for_display(deck)
+        return render_template("quiz.html", deck=deck.to_dict(current_user.id),
+                               cards=cards_data, next_cursor=next_cursor, card_window=CARD_WINDOW)
+
+    return http_cache.conditional(http_cache.make_etag("quiz", deck_id, CARD_WINDOW, *version), render)
+
+@app.route("/api/decks/<int:deck_id>/cards", methods=["GET"])
+@login_required
+def get_study_cards(deck_id):
+    """Keyset-paginated cards of a deck
+
+    Query params: after=<card id cursor>, limit (max 500), fields=id,term,...
+    and format=ndjson to stream every remaining card as one JSON object per line.
+    """
+    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first()
+    if not deck:
+        return jsonify({"error": "Deck not found"}), 404
+
+    after = request.args.get("after", type=int)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 500)
+
+    fields = request.args.get("fields")
+    if fields:
+        fields = tuple(f for f in fields.split(",") if f)
+        unknown = [f for f in fields if f not in Card.FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        if "id" not in fields:
+            fields = ("id",) + fields
+    else:
+        fields = Card.FIELDS
+
+    if request.args.get("format") == "ndjson":
+        query = Card.keyset_query(deck.id, after, fields)
+
+        def generate():
+            for row in query.yield_per(500):
+                yield json.dumps(Card.row_to_dict(row, fields)) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    cards, next_cursor = card_window(deck, after, limit, fields)
+    return jsonify({
+        "deck": deck.name,
+        "cards": cards,
+        "next_cursor": next_cursor
+    })
 
 @app.route('/decks/new', methods=['GET', 'POST'])
 @login_required
@@ -525,6 +730,7 @@ def mark_card_studied(card_id):
                 deck_id=card.deck_id
             )
             db.session.add(progress)
+            user_stats.record_activity(db.session.connection(), current_user.id)
             db.session.commit()
         
         return ("", 204)
@@ -532,6 +738,199 @@ def mark_card_studied(card_id):
         db.session.rollback()
         return ("Server error", 500)
 
+def _mark_studied(user_id, studied):
+    """Upsert (card_id, deck_id, studied_at) progress rows and count the new ones (caller commits)"""
+    if not studied:
+        return
+    already_studied = StudyProgress.query.filter(
+        StudyProgress.user_id == user_id,
+        StudyProgress.card_id.in_([card_id for card_id, _, _ in studied])
+    ).count()
+    StudyProgress.upsert_studied(user_id, studied)
+    user_stats.adjust(db.session.connection(), user_id, studied_count=len(studied) - already_studied)
+    # Core upsert: no mapper events, so invalidate the user's deck summaries here
+    fragment_cache.invalidate_on_commit(db.session(), fragment_cache.user_scope(user_id))
+
+STUDY_EVENTS = {"view", "flip", "correct", "incorrect"}
+MAX_STUDY_EVENTS = 1000
+
+def _event_time(value, now):
+    """Client timestamp (epoch ms or ISO 8601) as naive UTC, never in the future"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            when = datetime.utcfromtimestamp(value / 1000)
+        elif isinstance(value, str):
+            when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if when.tzinfo:
+                when = when.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            return now
+    except (ValueError, OverflowError, OSError):
+        return now
+    return min(when, now)
+
+@app.route("/api/study/events", methods=["POST"])
+@login_required
+def record_study_events():
+    """Batched study progress: {"events": [{"card_id", "event", "timestamp"}, ...]}
+
+    Sent periodically (and via sendBeacon when the page is hidden) instead of
+    one POST per card flip. All studied cards are upserted in one statement.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    events = data.get("events")
+    if not isinstance(events, list) or len(events) > MAX_STUDY_EVENTS:
+        return jsonify({"error": f"'events' must be a list of at most {MAX_STUDY_EVENTS} events"}), 400
+
+    now = datetime.utcnow()
+    latest = {}
+    answers = []  # (card_id, correct) for quiz answers
+    rejected = 0
+    for event in events:
+        card_id = event.get("card_id") if isinstance(event, dict) else None
+        if not isinstance(card_id, int) or event.get("event") not in STUDY_EVENTS:
+            rejected += 1
+            continue
+        when = _event_time(event.get("timestamp"), now)
+        if event["event"] in ("correct", "incorrect"):
+            answers.append((card_id, event["event"] == "correct"))
+        # Wrong quiz answers are accepted but don't count as studied
+        if event["event"] == "incorrect":
+            latest.setdefault(card_id, None)
+            continue
+        if latest.get(card_id) is None or when > latest[card_id]:
+            latest[card_id] = when
+
+    studied = []
+    owned_ids = set()
+    if latest:
+        owned = db.session.query(Card.id, Card.deck_id).join(Deck).filter(
+            Card.id.in_(latest.keys()),
+            Deck.owner_id == current_user.id
+        ).all()
+        owned_ids = {card_id for card_id, _ in owned}
+        studied = [(card_id, deck_id, latest[card_id]) for card_id, deck_id in owned
+                   if latest[card_id] is not None]
+        rejected += len(latest) - len(owned)
+    answers = [correct for card_id, correct in answers if card_id in owned_ids]
+
+    try:
+        _mark_studied(current_user.id, studied)
+        if studied or answers:
+            user_stats.record_activity(db.session.connection(), current_user.id, max(
+                [when for _, _, when in studied], default=now
+            ), correct=sum(answers), attempts=len(answers))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Failed to record study events: {e}")
+        return jsonify({"error": "Server error"}), 500
+
+    return jsonify({"recorded": len(studied), "rejected": rejected})
+
+MAX_QUIZ_ANSWERS = 1000
+
+@app.route("/api/quiz/<int:deck_id>/answers", methods=["POST"])
+@login_required
+def grade_quiz_answers(deck_id):
+    """Grade typed answers: {"answers": [{"card_id", "answer"}, ...]}
+
+    Answers are matched against the card's term with quiz_grading (accents, case
+    and small typos forgiven). Every answer is stored as a QuizAttempt and
+    correctly answered cards count as studied for deck mastery.
+    """
+    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first()
+    if not deck:
+        return jsonify({"error": "Deck not found"}), 404
+
+    data = request.get_json(force=True, silent=True) or {}
+    answers = data.get("answers")
+    if not isinstance(answers, list) or len(answers) > MAX_QUIZ_ANSWERS:
+        return jsonify({"error": f"'answers' must be a list of at most {MAX_QUIZ_ANSWERS} answers"}), 400
+
+    submitted = [(a.get("card_id"), a.get("answer")) for a in answers if isinstance(a, dict)]
+    submitted = [(card_id, answer) for card_id, answer in submitted
+                 if isinstance(card_id, int) and isinstance(answer, str)]
+    terms = dict(db.session.query(Card.id, Card.term).filter(
+        Card.deck_id == deck.id,
+        Card.id.in_({card_id for card_id, _ in submitted})
+    ).all()) if submitted else {}
+
+    now = datetime.utcnow()
+    results = []
+    attempts = []
+    for card_id, answer in submitted:
+        if card_id not in terms:
+            continue
+        correct, distance = quiz_grading.grade(answer, terms[card_id])
+        attempts.append((card_id, correct, distance))
+        results.append({"card_id": card_id, "correct": correct, "expected": terms[card_id]})
+
+    score = sum(1 for result in results if result["correct"])
+    correct_ids = {card_id for card_id, correct, _ in attempts if correct}
+    try:
+        QuizAttempt.record(current_user.id, deck.id, attempts, now)
+        _mark_studied(current_user.id, [(card_id, deck.id, now) for card_id in correct_ids])
+        if attempts:
+            user_stats.record_activity(db.session.connection(), current_user.id, now,
+                                       correct=score, attempts=len(attempts))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Failed to record quiz answers: {e}")
+        return jsonify({"error": "Server error"}), 500
+
+    return jsonify({
+        "results": results,
+        "score": score,
+        "total": len(results),
+        "rejected": len(answers) - len(results),
+    })
+
+@app.route("/api/dashboard", methods=["GET"])
+@login_required
+def api_dashboard():
+    """Deck/card totals, studied cards, quiz accuracy and study streaks for the current user"""
+    return jsonify(user_stats.dashboard(current_user.id))
+
+@app.route("/api/review/next", methods=["GET"])
+@login_required
+def api_review_next():
+    """Next due cards across all of the user's decks (?limit=N, max 100)"""
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    return jsonify({"cards": scheduler.due_cards(current_user.id, limit)})
+
+@app.route("/api/review/<int:card_id>", methods=["POST"])
+@login_required
+def api_review_card(card_id):
+    """Record a graded review: {"grade": 0-5 or "again"/"hard"/"good"/"easy"}"""
+    card = Card.query.join(Deck).filter(
+        Card.id == card_id,
+        Deck.owner_id == current_user.id
+    ).first()
+    if not card:
+        return jsonify({"error": "Card not found"}), 404
+
+    grade = scheduler.parse_grade((request.get_json(silent=True) or {}).get("grade"))
+    if grade is None:
+        return jsonify({"error": "grade must be 0-5 or again/hard/good/easy"}), 400
+
+    try:
+        progress = scheduler.review_card(current_user.id, card, grade)
+        user_stats.record_activity(db.session.connection(), current_user.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to record review"}), 500
+
+    return jsonify({
+        "card_id": card.id,
+        "due_at": progress.due_at.isoformat(),
+        "interval_days": progress.interval_days,
+        "ease": progress.ease,
+        "repetitions": progress.repetitions
+    })
+
 # API endpoint for adding cards via AJAX
 @app.route("/api/cards/create", methods=["POST"])
 @login_required
@@ -549,18 +948,17 @@ def api_create_card():
     if not deck:
         return jsonify({"error": "Deck not found or access denied"}), 404
     
-    # Generate AI image
-    image_url = generate_image_for_term(term, definition)
-    
     try:
+        # The AI image is generated in the background; poll /api/cards/<id>/image
         card = Card(
             deck_id=deck_id,
             term=term,
-            definition=definition,
-            image_url=image_url
+            definition=definition
         )
         db.session.add(card)
+        enqueue_image_job(card)
         db.session.commit()
+        image_workers.notify()
         
         return jsonify({
             "success": True,
@@ -570,10 +968,201 @@ def api_create_card():
         db.session.rollback()
         return jsonify({"error": "Failed to create card"}), 500
 
+@app.route("/api/decks/<int:deck_id>/import", methods=["POST"])
+@login_required
+def api_import_cards(deck_id):
+    """Bulk-import cards from an uploaded file or a JSON {"cards": [...]} body
+
+    Query params: format=auto|csv|tsv|json|ndjson|quizlet|anki, images=0 to skip
+    image generation, audio=1 to also synthesize term audio.
+    """
+    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first()
+    if not deck:
+        return jsonify({"error": "Deck not found or access denied"}), 404
+
+    generate_images = request.args.get("images", "1") != "0"
+    generate_audio = request.args.get("audio") == "1" and tts_synthesizer is not None
+
+    try:
+        if request.is_json:
+            rows = iter_records((request.get_json() or {}).get("cards"))
+        else:
+            upload = request.files.get("file")
+            if not upload:
+                return jsonify({"error": "No file uploaded"}), 400
+            rows = iter_rows(
+                text_stream(upload),
+                request.args.get("format", "auto"),
+                upload.filename
+            )
+        result = import_cards(
+            deck, rows,
+            generate_images=generate_images,
+            generate_audio=generate_audio,
+            on_batch=image_workers.notify
+        )
+    except CardImportError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnicodeDecodeError:
+        return jsonify({"error": "File must be UTF-8 text"}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Card import failed for deck {deck_id}: {e}")
+        return jsonify({"error": "Failed to import cards"}), 500
+
+    if "stopped_at_row" in result:
+        # Earlier batches are committed: the body says how far the import got
+        return jsonify(result), 500
+    return jsonify(result)
+
+@app.route("/search", methods=["GET"])
+@login_required
+def search():
+    """Ranked full-text search over the current user's cards and decks (?q=...&limit=...)"""
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(card_search.search(db.session, current_user.id, query, limit))
+
+@app.route("/api/fragment-cache/stats", methods=["GET"])
+@login_required
+def fragment_cache_stats():
+    return jsonify(fragment_cache.cache.stats())
+
+@app.route("/api/outbound/stats", methods=["GET"])
+@login_required
+def outbound_stats():
+    """Provider limits, breaker state and latency, plus whether this process has built each SDK client"""
+    stats = outbound.stats()
+    loaded = providers.loaded()
+    for name, provider_stats in stats.items():
+        provider_stats["client_loaded"] = name in loaded
+    return jsonify(stats)
+
+@app.route("/api/image-cache/stats", methods=["GET"])
+@login_required
+def image_cache_stats():
+    return jsonify(image_cache.stats())
+
+@app.route("/api/decks/<int:deck_id>/images", methods=["GET"])
+@login_required
+def deck_image_status(deck_id):
+    """Image state for several cards of a deck at once (?ids=1,2,3), for page polling"""
+    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first()
+    if not deck:
+        return jsonify({"error": "Deck not found"}), 404
+
+    try:
+        ids = [int(i) for i in request.args.get("ids", "").split(",") if i]
+    except ValueError:
+        return jsonify({"error": "Invalid ids"}), 400
+
+    query = Card.query.filter_by(deck_id=deck.id)
+    if ids:
+        query = query.filter(Card.id.in_(ids[:500]))
+    else:
+        query = query.filter(Card.image_status == "pending")
+
+    images = []
+    for card in query:
+        card_dict = card.to_dict()
+        images.append({
+            "card_id": card.id,
+            "image_status": card_dict["image_status"],
+            "image_url": card_dict["image_url"],
+            "image_variants": card_dict["image_variants"]
+        })
+    return jsonify({"images": images})
+
+@app.route("/api/decks/<int:deck_id>/prepare", methods=["GET", "POST"])
+@login_required
+def prepare_deck(deck_id):
+    """Queue images and audio for every card that lacks them (POST, ?audio=0 for images only), or report progress (GET)"""
+    deck = Deck.query.filter_by(id=deck_id, owner_id=current_user.id).first()
+    if not deck:
+        return jsonify({"error": "Deck not found"}), 404
+
+    if request.method == "GET":
+        return jsonify(deck_media_progress(deck.id))
+
+    audio = request.args.get("audio", "1") != "0" and tts_synthesizer is not None
+    try:
+        queued = prepare_deck_media(deck, audio=audio)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Preparing media for deck {deck_id} failed: {e}")
+        return jsonify({"error": "Failed to prepare deck"}), 500
+    if queued["queued_images"] or queued["queued_audio"]:
+        image_workers.notify()
+    return jsonify({**queued, "progress": deck_media_progress(deck.id)}), 202
+
+@app.route("/api/cards/<int:card_id>/image", methods=["GET"])
+@login_required
+def card_image_status(card_id):
+    """Report background image generation state so pages can poll for it"""
+    card = Card.query.join(Deck).filter(
+        Card.id == card_id,
+        Deck.owner_id == current_user.id
+    ).first()
+
+    if not card:
+        return jsonify({"error": "Card not found"}), 404
+
+    card_dict = card.to_dict()
+    return jsonify({
+        "card_id": card.id,
+        "image_status": card_dict["image_status"],
+        "image_url": card_dict["image_url"],
+        "image_variants": card_dict["image_variants"]
+    })
+
+def init_db():
+    """Create tables and bring an existing database up to date"""
+    db.create_all()
+    upgrade_schema()
+    scheduler.backfill_schedule()
+    card_search.ensure_index(db.engine)
+
+def prepare_app(start_workers=None, setup_db=None):
+    """Prepare the app for serving: database setup, then (optionally) the image workers
+
+    Routes are registered on the module-level app at import time; this runs
+    the one-off setup a server process needs. It is not a factory: every
+    caller gets that same app and image_workers pool. start_workers defaults to the
+    START_IMAGE_WORKERS environment variable (on unless set to 0), so a web
+    tier can leave generation to `flask image-worker` processes. setup_db
+    defaults to INIT_DB (on unless set to 0); gunicorn runs `flask init-db`
+    once before forking and turns it off, so workers don't race on DDL.
+    """
+    if setup_db is None:
+        setup_db = os.getenv("INIT_DB", "1") != "0"
+    if setup_db:
+        with app.app_context():
+            try:
+                init_db()
+            except Exception:
+                logging.exception("Database setup failed")
+                raise
+    if start_workers is None:
+        start_workers = os.getenv("START_IMAGE_WORKERS", "1") != "0"
+    if start_workers:
+        image_workers.start()
+    return app
+
+def shutdown(timeout=None):
+    """Stop taking image jobs and wait for the ones in flight to finish"""
+    if image_workers.running:
+        logging.info("Draining image workers...")
+        if not image_workers.stop(timeout):
+            logging.warning("Image workers still busy after %ss; their jobs were requeued", timeout)
+
 if __name__ == "__main__":
-    with app.app_context():
-        try:
-            db.create_all()
-        except:
-            pass
-    app.run(debug=True, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Development server; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
+    debug = os.getenv("FLASK_DEBUG", "1") == "1"
+    # With the reloader on, only start workers in the child process that serves requests
+    prepare_app(start_workers=not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true")
+    signal.signal(signal.SIGTERM, lambda signum, frame: (shutdown(), sys.exit(0)))
+    try:
+        app.run(debug=debug, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
+    finally:
+        shutdown()
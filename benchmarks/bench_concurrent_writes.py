@@ -0,0 +1,123 @@
+# benchmarks/bench_concurrent_writes.py
+"""Concurrent study-progress writers and dashboard readers against one SQLite file.
+
+Compares plain sqlite3 connections (rollback journal, default 5s timeout, as
+visualmode_page.py used to open them) with db_config.connect_sqlite (WAL,
+busy timeout, synchronous=NORMAL).
+
+Usage: python -m benchmarks.bench_concurrent_writes [seconds] [writers] [readers]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import db_config
+
+SCHEMA = """
+CREATE TABLE study_progress (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    card_id INTEGER NOT NULL,
+    deck_id INTEGER NOT NULL,
+    studied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, card_id)
+);
+CREATE INDEX ix_study_progress_user_deck ON study_progress (user_id, deck_id);
+"""
+NUM_USERS = 30
+NUM_CARDS = 2000
+
+
+def setup(path, connect):
+    conn = connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO study_progress (user_id, card_id, deck_id) VALUES (?, ?, ?)",
+        [(u, c, c // 100) for u in range(NUM_USERS) for c in range(0, NUM_CARDS, 2)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(label, connect, seconds, num_writers, num_readers):
+    path = os.path.join(tempfile.mkdtemp(prefix="gptsd-bench-"), "deck.db")
+    setup(path, connect)
+
+    stop = time.perf_counter() + seconds
+    counts = {"writes": 0, "reads": 0, "locked": 0, "conflicts": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        # One connection and one transaction per "card flip", like mark_card_studied
+        while time.perf_counter() < stop:
+            user, card = random.randrange(NUM_USERS), random.randrange(NUM_CARDS)
+            conn = connect(path)
+            try:
+                exists = conn.execute(
+                    "SELECT 1 FROM study_progress WHERE user_id = ? AND card_id = ?", (user, card)
+                ).fetchone()
+                if exists:
+                    conn.execute("UPDATE study_progress SET studied_at = CURRENT_TIMESTAMP "
+                                 "WHERE user_id = ? AND card_id = ?", (user, card))
+                else:
+                    conn.execute("INSERT INTO study_progress (user_id, card_id, deck_id) "
+                                 "VALUES (?, ?, ?)", (user, card, card // 100))
+                conn.commit()
+                bump("writes")
+            except sqlite3.IntegrityError:
+                # Two writers raced on the same new (user, card) row
+                bump("conflicts")
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                bump("locked")
+            finally:
+                conn.close()
+
+    def reader():
+        conn = connect(path)
+        while time.perf_counter() < stop:
+            try:
+                conn.execute("SELECT deck_id, COUNT(*) FROM study_progress GROUP BY deck_id").fetchall()
+                bump("reads")
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                bump("locked")
+        conn.close()
+
+    threads = ([threading.Thread(target=writer) for _ in range(num_writers)] +
+               [threading.Thread(target=reader) for _ in range(num_readers)])
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"{label:<10} writes/s {counts['writes'] / seconds:8.1f}   reads/s {counts['reads'] / seconds:8.1f}"
+          f"   'database is locked' errors {counts['locked']}")
+
+
+def plain_connect(path):
+    return sqlite3.connect(path)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    num_writers = int(sys.argv[2]) if len(sys.argv) > 2 else 48
+    num_readers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    print(f"{seconds:g}s, {num_writers} writers, {num_readers} readers")
+    random.seed(0)
+    run("default", plain_connect, seconds, num_writers, num_readers)
+    run("db_config", db_config.connect_sqlite, seconds, num_writers, num_readers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_deck_summaries.py
+"""Per-deck Deck.to_dict() versus the aggregated Deck.summaries() query.
+
+Usage: python -m benchmarks.bench_deck_summaries
+"""
+import random
+
+from benchmarks.common import QueryCounter, make_bench_app, time_call
+from deck_database import db, User, Deck, Card, StudyProgress
+
+DECK_COUNTS = [10, 50, 200]
+CARDS_PER_DECK = 20
+
+
+def populate(num_decks):
+    user = User(name="Bench", email=f"bench{num_decks}@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+
+    decks = [Deck(name=f"Deck {i}", owner_id=user.id) for i in range(num_decks)]
+    db.session.add_all(decks)
+    db.session.flush()
+
+    cards = [Card(term=f"term {d.id}-{i}", definition="definition", deck_id=d.id)
+             for d in decks for i in range(CARDS_PER_DECK)]
+    db.session.add_all(cards)
+    db.session.flush()
+
+    db.session.add_all([
+        StudyProgress(user_id=user.id, card_id=c.id, deck_id=c.deck_id)
+        for c in cards if random.random() < 0.5
+    ])
+    db.session.commit()
+    return user
+
+
+def main():
+    random.seed(0)
+    app = make_bench_app()
+    print(f"{'decks':>6} | {'to_dict queries':>15} {'to_dict ms':>11} | {'summaries queries':>17} {'summaries ms':>13}")
+    with app.app_context():
+        for num_decks in DECK_COUNTS:
+            user = populate(num_decks)
+
+            def per_deck():
+                return [deck.to_dict(user.id) for deck in user.decks.all()]
+
+            def aggregated():
+                return Deck.summaries(user.id)
+
+            with QueryCounter(db.engine) as old_queries:
+                expected = per_deck()
+            with QueryCounter(db.engine) as new_queries:
+                actual = aggregated()
+            assert expected == actual, "summaries() disagrees with to_dict()"
+
+            old_ms, _ = time_call(per_deck)
+            new_ms, _ = time_call(aggregated)
+            print(f"{num_decks:>6} | {old_queries.count:>15} {old_ms:>11.1f} | "
+                  f"{new_queries.count:>17} {new_ms:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
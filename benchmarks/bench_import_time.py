@@ -0,0 +1,103 @@
+# benchmarks/bench_import_time.py
+"""Cold-start cost of importing the app, from `python -X importtime`.
+
+Imports the target module (default: app) in fresh interpreters with the stub
+environment, then reports the median wall time, the import cost of each
+top-level package (cumulative time of its first import), the slowest
+individual modules, and whether the provider SDKs were loaded.
+
+--save writes the per-package numbers as JSON; --baseline compares against
+such a file and exits with status 1 if the total grew by more than
+--tolerance.
+
+Usage: python -m benchmarks.bench_import_time [--module app] [--runs 5] [--top 15]
+       [--save imports.json] [--baseline imports.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import stub_app_environment
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+SDKS = ("google.genai", "ibm_watson", "ibm_cloud_sdk_core", "PIL", "requests")
+
+
+def import_profile(module, env):
+    """(wall seconds, [(self_us, cumulative_us, depth, name), ...]) for one cold import"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(result.stderr[-2000:])
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), (len(indent) - 1) // 2, name))
+    return wall, rows
+
+
+def package_costs(rows):
+    """Cumulative import time (ms) per top-level package, counted where it was first imported"""
+    costs = {}
+    for _, cumulative_us, _, name in rows:
+        package = name.split(".")[0]
+        # -X importtime lists children before parents; the outermost entry has the largest total
+        costs[package] = max(costs.get(package, 0), cumulative_us / 1000)
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub_app_environment()
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    import_profile(args.module, env)  # warm the bytecode and filesystem caches
+    runs = [import_profile(args.module, env) for _ in range(args.runs)]
+    wall = statistics.median(run[0] for run in runs) * 1000
+    rows = min(runs, key=lambda run: run[0])[1]
+    total = next((cumulative / 1000 for _, cumulative, _, name in rows if name == args.module), None)
+
+    print(f"import {args.module}: median wall {wall:.0f} ms over {args.runs} runs, "
+          f"-X importtime total {total:.0f} ms")
+    imported = {name for _, _, _, name in rows}
+    print("provider SDKs loaded: " + (", ".join(sdk for sdk in SDKS if sdk in imported) or "none"))
+
+    costs = package_costs(rows)
+    print(f"\n{'package':28s} {'cumulative ms':>14s}")
+    for package, ms in sorted(costs.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:28s} {ms:14.1f}")
+
+    print(f"\n{'module':40s} {'self ms':>8s}")
+    for self_us, _, _, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{name:40s} {self_us / 1000:8.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"module": args.module, "wall_ms": wall, "total_ms": total, "packages": costs}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if total > baseline["total_ms"] * (1 + args.tolerance):
+            print(f"REGRESSION import {args.module}: {baseline['total_ms']:.0f} -> {total:.0f} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_login.py
+"""Login throughput per password hash policy, and the per-request cost of load_user.
+
+1. For each hash method: time to verify one password, and logins/s through
+   POST /login with concurrent clients (hashing dominates a login).
+2. Rehash-on-login: users hashed with the old pbkdf2 policy log in under a
+   new one; the first login rewrites the hash, later ones use the new cost.
+3. GET /api/decks with the user cache off and on: SQL statements per
+   request and median latency.
+
+Usage: python -m benchmarks.bench_login [clients]
+"""
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import stub_app_environment, time_call
+
+stub_app_environment()  # must run before app is imported
+
+import app as application  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+from deck_database import db, User  # noqa: E402
+import passwords  # noqa: E402
+import user_cache  # noqa: E402
+
+METHODS = ["pbkdf2:sha256", "pbkdf2:sha256:260000", "scrypt:32768:8:1", "scrypt:16384:8:1"]
+LOGINS_PER_CLIENT = 4
+
+
+def set_all_passwords(method):
+    stored = passwords.hash_password(datagen.PASSWORD, method)
+    with application.app.app_context():
+        User.query.update({"password_hash": stored})
+        db.session.commit()
+    user_cache.cache.clear()
+
+
+def login(client, user_id):
+    response = client.post("/login", data={"email": datagen.email(user_id), "password": datagen.PASSWORD})
+    assert response.status_code == 302, response.status_code
+    client.get("/logout")
+
+
+def login_throughput(user_ids):
+    """logins/s with one thread per user, each logging in and out LOGINS_PER_CLIENT times"""
+    def drive(user_id):
+        client = application.app.test_client()
+        for _ in range(LOGINS_PER_CLIENT):
+            login(client, user_id)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(user_ids) * LOGINS_PER_CLIENT / (time.perf_counter() - start)
+
+
+def stored_method(user_id):
+    with application.app.app_context():
+        return db.session.get(User, user_id).password_hash.split("$", 1)[0]
+
+
+def main():
+    num_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    app = application.prepare_app(start_workers=False)
+    app.config["WTF_CSRF_ENABLED"] = False
+    # Requests run outside this app context so each gets its own session, as in production
+    with app.app_context():
+        user_ids = list(datagen.generate(num_clients, 5, 20))
+
+    print(f"-- hash policy, {num_clients} concurrent clients")
+    print(f"{'method':24s} {'verify ms':>10s} {'logins/s':>9s}")
+    for method in METHODS:
+        passwords.HASH_METHOD = method
+        stored = passwords.hash_password(datagen.PASSWORD, method)
+        verify_ms, _ = time_call(lambda: passwords.verify(stored, datagen.PASSWORD), repeat=5)
+        set_all_passwords(method)
+        print(f"{method:24s} {verify_ms:10.1f} {login_throughput(user_ids):9.1f}")
+
+    print("-- rehash on login: stored as pbkdf2:sha256, policy scrypt:16384:8:1")
+    passwords.HASH_METHOD = "pbkdf2:sha256"
+    set_all_passwords("pbkdf2:sha256")
+    passwords.HASH_METHOD = "scrypt:16384:8:1"
+    client = application.app.test_client()
+    for attempt in ("first", "second"):
+        start = time.perf_counter()
+        login(client, user_ids[0])
+        print(f"{attempt} login {1000 * (time.perf_counter() - start):7.1f} ms, "
+              f"stored hash now {stored_method(user_ids[0])}")
+
+    print("-- GET /api/decks, load_user cache off vs on")
+    client = application.app.test_client()
+    client.post("/login", data={"email": datagen.email(user_ids[0]), "password": datagen.PASSWORD})
+    for label, ttl in (("off", 0), ("on", 30)):
+        user_cache.cache.ttl = ttl
+        user_cache.cache.clear()
+        latencies, queries = [], []
+        for _ in range(300):
+            start = time.perf_counter()
+            response = client.get("/api/decks")
+            assert response.status_code == 200, response.status_code
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(int(response.headers["Server-Timing"].split('desc="')[1].split()[0]))
+        print(f"cache {label:3s}: {statistics.mean(queries):.1f} queries/request, "
+              f"p50 {statistics.median(latencies):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
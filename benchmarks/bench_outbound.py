@@ -0,0 +1,151 @@
+# benchmarks/bench_outbound.py
+"""outbound.Provider against a local stub upstream.
+
+A threaded HTTP stub plays the provider: it answers after a fixed latency,
+fails a configurable share of requests with 503, or hangs past the client
+timeout. Many caller threads go through one Provider, with and without the
+guard rails, and we report success rate, wall time, the peak number of
+requests the callers had open and the latency histogram.
+
+Usage: python -m benchmarks.bench_outbound [callers]
+"""
+import logging
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import outbound
+
+
+class Upstream:
+    """Behaviour of the stub, changed between scenarios, and the callers' peak concurrency"""
+    latency = 0.05
+    failure_rate = 0.0
+    hang = False
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, **settings):
+        cls.latency, cls.failure_rate, cls.hang = 0.05, 0.0, False
+        cls.in_flight = cls.peak = 0
+        for name, value in settings.items():
+            setattr(cls, name, value)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            time.sleep(5.0 if Upstream.hang else Upstream.latency)
+            status = 503 if random.random() < Upstream.failure_rate else 200
+            body = b"ok" if status == 200 else b"unavailable"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def fetch(url, timeout):
+    with Upstream.lock:
+        Upstream.in_flight += 1
+        Upstream.peak = max(Upstream.peak, Upstream.in_flight)
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    finally:
+        with Upstream.lock:
+            Upstream.in_flight -= 1
+
+
+def unguarded(url):
+    """What the app did before: one attempt, no limits (but still a client timeout)"""
+    return lambda: fetch(url, 1.0)
+
+
+def guarded(url, **settings):
+    provider = outbound.Provider(
+        "stub", timeout=1.0,
+        breaker=outbound.CircuitBreaker(failure_threshold=5, reset_after=10.0),
+        **dict(dict(max_concurrency=4, deadline=5.0, max_attempts=3, backoff_base=0.05), **settings))
+    return (lambda: provider.call(fetch, url, provider.timeout)), provider
+
+
+def drive(call, callers, calls_each):
+    ok = failed = 0
+    lock = threading.Lock()
+
+    def caller():
+        nonlocal ok, failed
+        for _ in range(calls_each):
+            try:
+                call()
+                result = True
+            except (outbound.ProviderUnavailable, urllib.error.URLError, OSError):
+                result = False
+            with lock:
+                if result:
+                    ok += 1
+                else:
+                    failed += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ok, failed, time.perf_counter() - start
+
+
+def report(label, ok, failed, seconds, provider=None):
+    line = (f"{label:34s} ok {ok:4d}  failed {failed:4d}  {seconds:6.2f}s  "
+            f"peak concurrent requests {Upstream.peak:3d}")
+    if provider is not None:
+        stats = provider.stats()
+        latency = stats["latency"]
+        line += (f"  retries {stats['retries']:3d}  rejected {stats['rejected']:4d}"
+                 f"  breaker {stats['breaker']['state']}  p50<={latency['p50_ms']}ms p95<={latency['p95_ms']}ms")
+    print(line)
+
+
+def main():
+    callers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    random.seed(0)
+    logging.getLogger("outbound").setLevel(logging.ERROR)  # retry warnings
+    server, url = start_stub()
+    try:
+        scenarios = [
+            ("healthy", {}, 4),
+            ("20% 503s", {"failure_rate": 0.2}, 4),
+            ("outage: every request hangs", {"hang": True}, 2),
+        ]
+        for name, settings, calls_each in scenarios:
+            print(f"-- {name}, {callers} callers x {calls_each} calls")
+            Upstream.reset(**settings)
+            report("unguarded", *drive(unguarded(url), callers, calls_each))
+            Upstream.reset(**settings)
+            call, provider = guarded(url)
+            report("provider (4 slots, 3 attempts)", *drive(call, callers, calls_each), provider)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
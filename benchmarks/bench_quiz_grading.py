@@ -0,0 +1,61 @@
+# benchmarks/bench_quiz_grading.py
+"""Time to grade one quiz submission with quiz_grading.
+
+Usage: python -m benchmarks.bench_quiz_grading [num_answers]
+"""
+import random
+import string
+import sys
+
+from benchmarks.common import time_call
+import quiz_grading
+
+WORDS = ["photosynthesis", "mitochondria", "café", "electromagnetic induction", "Ox",
+         "the French Revolution", "déjà vu", "H2O", "cellular respiration", "Pythagorean theorem"]
+
+
+def make_term(rng):
+    return " ".join(rng.sample(WORDS, rng.randint(1, 2))) + f" {rng.randint(1, 999)}"
+
+
+def typo(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+def make_submission(num_answers, rng):
+    """A mix of exact, re-cased, misspelled and wrong answers"""
+    pairs = []
+    for _ in range(num_answers):
+        expected = make_term(rng)
+        kind = rng.random()
+        if kind < 0.4:
+            answer = expected
+        elif kind < 0.55:
+            answer = expected.upper()
+        elif kind < 0.8:
+            answer = typo(rng, expected)
+        else:
+            answer = make_term(rng)
+        pairs.append((answer, expected))
+    return pairs
+
+
+def main():
+    num_answers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(0)
+    pairs = make_submission(num_answers, rng)
+
+    def cold():
+        quiz_grading.normalize.cache_clear()
+        return quiz_grading.grade_batch(pairs)
+
+    cold_ms, results = time_call(cold, repeat=20)
+    warm_ms, _ = time_call(lambda: quiz_grading.grade_batch(pairs), repeat=20)
+    correct = sum(1 for ok, _ in results if ok)
+    print(f"{num_answers} answers ({correct} graded correct): "
+          f"{cold_ms:.2f} ms cold normalize cache, {warm_ms:.2f} ms warm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_review_queue.py
+"""Latency of the /api/review/next query over a large synthetic review history.
+
+Usage: python -m benchmarks.bench_review_queue [num_reviews]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import QueryCounter, make_bench_app, time_call
+from deck_database import db, User, Deck, Card, StudyProgress
+import scheduler
+
+NUM_USERS = 5
+NUM_DECKS = 50
+
+
+def populate(num_reviews):
+    """One heavy user with num_reviews progress rows plus a few lighter users"""
+    now = datetime.utcnow()
+    users = [User(name=f"User {i}", email=f"user{i}@example.com", password_hash="x")
+             for i in range(NUM_USERS)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    heavy = users[0]
+    decks = [Deck(name=f"Deck {i}", owner_id=heavy.id) for i in range(NUM_DECKS)]
+    db.session.add_all(decks)
+    db.session.flush()
+
+    per_deck = num_reviews // NUM_DECKS
+    db.session.execute(Card.__table__.insert(), [
+        {"term": f"term {d.id}-{i}", "definition": "definition", "deck_id": d.id}
+        for d in decks for i in range(per_deck)
+    ])
+    cards = db.session.query(Card.id, Card.deck_id).all()
+
+    rows = []
+    for user in users:
+        sample = cards if user is heavy else random.sample(cards, len(cards) // 10)
+        for card_id, deck_id in sample:
+            interval = random.choice([1, 6, 15, 38, 90])
+            due_at = now + timedelta(days=random.uniform(-30, interval))
+            rows.append({
+                "user_id": user.id, "card_id": card_id, "deck_id": deck_id,
+                "studied_at": due_at - timedelta(days=interval), "ease": 2.5,
+                "interval_days": interval, "repetitions": 3, "lapses": 0, "due_at": due_at,
+            })
+    db.session.execute(StudyProgress.__table__.insert(), rows)
+    db.session.commit()
+    return heavy, len(rows)
+
+
+def main():
+    num_reviews = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    random.seed(0)
+    app = make_bench_app()
+    with app.app_context():
+        heavy, total = populate(num_reviews)
+        print(f"{total} review records ({num_reviews} for the measured user)")
+
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT card_id FROM study_progress "
+            "WHERE user_id = :u AND due_at <= :now ORDER BY due_at LIMIT 20"
+        ), {"u": heavy.id, "now": datetime.utcnow()}).fetchall()
+        print("plan:", "; ".join(row[-1] for row in plan))
+
+        for limit in (1, 20, 100):
+            with QueryCounter(db.engine) as queries:
+                scheduler.due_cards(heavy.id, limit)
+            ms, cards = time_call(lambda: scheduler.due_cards(heavy.id, limit), repeat=20)
+            print(f"limit={limit:>3}: {ms:6.2f} ms median, {queries.count} query, {len(cards)} cards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# benchmarks/bench_routes.py
+"""Scripted load against the core routes, in process, with stubbed providers.
+
+Generates a data set with benchmarks.datagen, then for each route runs a
+fixed number of requests from concurrent logged-in test clients and reports
+throughput, latency percentiles and SQL statements per request (read from the
+Server-Timing header that metrics.py adds). Gemini and Watson are replaced by
+the local fakes (IMAGE_GENERATOR=fake, TTS_SYNTHESIZER=fake) and the image
+workers are not started, so runs are reproducible and need no network.
+
+--save writes the results as JSON; --baseline compares against such a file
+and exits with status 1 if a route's p50 latency grew by more than
+--tolerance or it now issues more queries per request.
+
+Usage: python -m benchmarks.bench_routes [--users N] [--decks N] [--cards N]
+       [--requests N] [--clients N] [--save results.json] [--baseline results.json]
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import stub_app_environment
+
+stub_app_environment()  # must run before app is imported
+
+from sqlalchemy import select  # noqa: E402
+
+import app as application  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+from deck_database import db, Card  # noqa: E402
+
+QUERY_COUNT = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+class Client:
+    """A logged-in test client for one generated user"""
+
+    def __init__(self, user_id, deck_ids, card_ids, rng):
+        self.http = application.app.test_client()
+        self.deck_ids = deck_ids
+        self.card_ids = card_ids
+        self.rng = rng
+        response = self.http.post("/login", data={"email": datagen.email(user_id),
+                                                  "password": datagen.PASSWORD})
+        assert response.status_code == 302, f"login failed for user {user_id}"
+
+    def deck(self):
+        return self.rng.choice(self.deck_ids)
+
+    def card(self):
+        return self.rng.choice(self.card_ids)
+
+
+ROUTES = {
+    "home": lambda c: c.http.get("/home"),
+    "study": lambda c: c.http.get(f"/decks/{c.deck()}/study"),
+    "quiz": lambda c: c.http.get(f"/decks/{c.deck()}/quiz"),
+    "mark_studied": lambda c: c.http.post(f"/api/cards/{c.card()}/study"),
+    "create_card": lambda c: c.http.post("/api/cards/create", json={
+        "deck_id": c.deck(), "term": f"bench term {c.rng.random():.6f}", "definition": "benchmark card",
+    }),
+}
+
+
+def run_route(name, clients, num_requests):
+    """Spread num_requests over the clients' threads; returns the result row"""
+    request = ROUTES[name]
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    per_client = max(1, num_requests // len(clients))
+
+    def drive(client):
+        for _ in range(per_client):
+            start = time.perf_counter()
+            response = request(client)
+            elapsed = (time.perf_counter() - start) * 1000
+            timing = QUERY_COUNT.search(", ".join(response.headers.getlist("Server-Timing")))
+            with lock:
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+                latencies.append(elapsed)
+                queries.append(int(timing.group(1)) if timing else 0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "route": name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)], 2),
+        "queries": round(statistics.mean(queries), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results that are worse than baseline"""
+    previous = {row["route"]: row for row in baseline["results"]}
+    problems = []
+    for row in results:
+        before = previous.get(row["route"])
+        if not before:
+            continue
+        if row["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            problems.append(f"{row['route']}: p50 {before['p50_ms']} -> {row['p50_ms']} ms")
+        if row["queries"] > before["queries"]:
+            problems.append(f"{row['route']}: queries/request {before['queries']} -> {row['queries']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the core routes")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--decks", type=int, default=10, help="decks per user")
+    parser.add_argument("--cards", type=int, default=100, help="cards per deck")
+    parser.add_argument("--requests", type=int, default=400, help="requests per route")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients")
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    app = application.prepare_app(start_workers=False)
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        started = time.perf_counter()
+        decks = datagen.generate(args.users, args.decks, args.cards, seed=args.seed)
+        print(f"Generated {args.users} users x {args.decks} decks x {args.cards} cards "
+              f"in {time.perf_counter() - started:.1f}s")
+        user_ids = list(decks)[:args.clients]
+        cards = {user_id: db.session.execute(
+            select(Card.id).where(Card.deck_id.in_(decks[user_id]))).scalars().all()
+            for user_id in user_ids}
+
+    rng = random.Random(args.seed)
+    clients = [Client(user_id, decks[user_id], cards[user_id], random.Random(rng.random()))
+               for user_id in user_ids]
+
+    results = []
+    print(f"{'route':14s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'queries':>8s} {'errors':>7s}")
+    for name in args.routes.split(","):
+        row = run_route(name, clients, args.requests)
+        results.append(row)
+        print(f"{name:14s} {row['rps']:8.1f} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} "
+              f"{row['p99_ms']:8.2f} {row['queries']:8.1f} {row['errors']:7d}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
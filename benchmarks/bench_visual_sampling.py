@@ -0,0 +1,79 @@
+# benchmarks/bench_visual_sampling.py
+"""Visual-mode card sampling: ORDER BY RANDOM() vs card_sampler on large decks.
+
+Usage: python -m benchmarks.bench_visual_sampling [deck_size ...]
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_bench_app, time_call
+from card_sampler import sample_cards
+from db_config import connect_sqlite
+from deck_database import db, User, Deck, Card, StudyProgress
+
+LIMIT = 10
+STUDIED_SHARE = 0.2
+
+
+def populate(sizes):
+    """One deck per size, interleaved with a small deck so ids have gaps"""
+    now = datetime.utcnow()
+    user = User(name="Bench", email="bench@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+
+    decks = {}
+    for size in sizes:
+        deck = Deck(name=f"{size} cards", owner_id=user.id)
+        filler = Deck(name=f"filler {size}", owner_id=user.id)
+        db.session.add_all([deck, filler])
+        db.session.flush()
+        rows = []
+        for i in range(size):
+            rows.append({"term": f"term {i}", "definition": "definition", "deck_id": deck.id})
+            if i % 10 == 0:
+                rows.append({"term": f"filler {i}", "definition": "definition", "deck_id": filler.id})
+        db.session.execute(Card.__table__.insert(), rows)
+
+        card_ids = [row[0] for row in db.session.query(Card.id).filter_by(deck_id=deck.id)]
+        db.session.execute(StudyProgress.__table__.insert(), [{
+            "user_id": user.id, "card_id": card_id, "deck_id": deck.id,
+            "studied_at": now, "ease": random.uniform(1.3, 2.8), "interval_days": 6,
+            "repetitions": 2, "lapses": random.choice([0, 0, 0, 1, 3]),
+            "due_at": now + timedelta(days=random.uniform(-10, 10)),
+        } for card_id in random.sample(card_ids, int(size * STUDIED_SHARE))])
+        decks[size] = deck.id
+    db.session.commit()
+    return user.id, decks
+
+
+def order_by_random(conn, deck_id):
+    return [row[0] for row in conn.execute(
+        'SELECT id FROM cards WHERE deck_id = ? ORDER BY RANDOM() LIMIT ?', (deck_id, LIMIT))]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000, 100_000]
+    random.seed(0)
+    app = make_bench_app()
+    with app.app_context():
+        user_id, decks = populate(sizes)
+        db_path = db.engine.url.database
+    conn = connect_sqlite(db_path)
+    print(f"database: {os.path.getsize(db_path) / 1e6:.1f} MB, limit={LIMIT}")
+
+    for size, deck_id in decks.items():
+        baseline, _ = time_call(lambda: order_by_random(conn, deck_id), repeat=20)
+        uniform, ids = time_call(lambda: sample_cards(conn, user_id, deck_id, LIMIT), repeat=20)
+        weighted, _ = time_call(lambda: sample_cards(conn, user_id, deck_id, LIMIT, weighted=True),
+                                repeat=20)
+        assert len(set(ids)) == LIMIT
+        print(f"{size:>7} cards: ORDER BY RANDOM() {baseline:7.2f} ms | "
+              f"sampler {uniform:5.2f} ms | weighted {weighted:6.2f} ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/common.py
+"""Shared helpers for the benchmark scripts (run them from the repo root)."""
+import os
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import event
+
+import db_config
+from deck_database import db
+
+
+def make_bench_app(db_path=None):
+    """A bare Flask app bound to a throwaway SQLite database, configured like app.py"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="gptsd-bench-"), "bench.db")
+    app = Flask(__name__)
+    db_config.configure_app(app, f"sqlite:///{db_path}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def stub_app_environment():
+    """Point app.py at a throwaway SQLite file with fake providers; call before importing app
+
+    Returns the database path. Image workers are left off so runs are reproducible.
+    """
+    db_path = os.path.join(tempfile.mkdtemp(prefix="gptsd-bench-"), "app.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "IMAGE_GENERATOR": "fake",
+        "TTS_SYNTHESIZER": "fake",
+        "GENAI_KEY": "",
+        "IBM_TTS_API_KEY": "",
+        "START_IMAGE_WORKERS": "0",
+        "TTS_CACHE_DIR": os.path.join(os.path.dirname(db_path), "tts_cache"),
+        "LOG_LEVEL": "WARNING",
+        "SLOW_REQUEST_MS": "60000",
+    })
+    return db_path
+
+
+class QueryCounter:
+    """Count SQL statements executed on an engine while the context is active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def time_call(fn, repeat=5):
+    """Run fn repeat times and return (median_ms, last_result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
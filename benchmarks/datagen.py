@@ -0,0 +1,105 @@
+# benchmarks/datagen.py
+"""Synthetic users, decks, cards and study progress for benchmarks.
+
+Rows are bulk-inserted with executemany (no ORM objects), so large data sets
+load in seconds. Everything is derived from the seed, so a run with the same
+arguments produces the same database. user_stats rows are left to be
+computed on first use, as they would be for an existing user.
+
+Usage: python -m benchmarks.datagen <sqlite path> [users] [decks_per_user] [cards_per_deck]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from deck_database import db, User, Deck, Card, StudyProgress
+
+PASSWORD = "bench-password"
+SUBJECTS = ["Biology", "Chemistry", "Spanish", "History", "Physics", "Computer Science"]
+WORDS = ["cell", "atom", "energy", "protein", "function", "river", "empire", "molecule",
+         "equation", "gravity", "verb", "treaty", "enzyme", "orbit", "variable", "charge"]
+
+
+def email(user_id):
+    return f"bench{user_id}@example.com"
+
+
+def generate(num_users=10, decks_per_user=5, cards_per_deck=50, studied_share=0.5, seed=0):
+    """Insert the data set (inside an app context) and return {user_id: [deck ids]}
+
+    Users log in as email(user_id) with PASSWORD. studied_share of each
+    user's cards get a StudyProgress row with a spread of review schedules.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    probe = User(email="", name="")
+    probe.set_password(PASSWORD)  # hashing is slow; every user shares the hash
+
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    db.session.execute(User.__table__.insert(), [
+        {"id": first_user + i, "email": email(first_user + i), "name": f"Bench User {i}",
+         "password_hash": probe.password_hash, "created_at": now, "is_active": True}
+        for i in range(num_users)
+    ])
+
+    first_deck = (db.session.query(db.func.max(Deck.id)).scalar() or 0) + 1
+    decks = {}
+    deck_rows = []
+    for u in range(num_users):
+        user_id = first_user + u
+        decks[user_id] = []
+        for d in range(decks_per_user):
+            deck_id = first_deck + len(deck_rows)
+            subject = rng.choice(SUBJECTS)
+            decks[user_id].append(deck_id)
+            deck_rows.append({"id": deck_id, "owner_id": user_id, "name": f"{subject} {d + 1}",
+                              "description": f"Synthetic {subject.lower()} deck", "category": subject,
+                              "created_at": now, "updated_at": now, "is_public": False})
+    db.session.execute(Deck.__table__.insert(), deck_rows)
+
+    first_card = (db.session.query(db.func.max(Card.id)).scalar() or 0) + 1
+    card_rows = []
+    progress_rows = []
+    for user_id, deck_ids in decks.items():
+        for deck_id in deck_ids:
+            for c in range(cards_per_deck):
+                card_id = first_card + len(card_rows)
+                term = f"{rng.choice(WORDS)} {deck_id}-{c}"
+                card_rows.append({
+                    "id": card_id, "deck_id": deck_id, "term": term,
+                    "definition": " ".join(rng.choices(WORDS, k=rng.randint(4, 12))),
+                    "image_url": f"https://picsum.photos/600/400?random={500 + card_id % 400}",
+                    "image_status": "ready", "created_at": now, "updated_at": now,
+                })
+                if rng.random() < studied_share:
+                    interval = rng.choice([0, 1, 3, 7, 21])
+                    reviewed = now - timedelta(days=rng.randint(0, 30))
+                    progress_rows.append({
+                        "user_id": user_id, "card_id": card_id, "deck_id": deck_id,
+                        "studied_at": reviewed, "last_reviewed_at": reviewed,
+                        "ease": round(rng.uniform(1.3, 2.8), 2), "interval_days": interval,
+                        "repetitions": rng.randint(0, 6), "lapses": rng.randint(0, 2),
+                        "due_at": reviewed + timedelta(days=interval),
+                    })
+    db.session.execute(Card.__table__.insert(), card_rows)
+    if progress_rows:
+        db.session.execute(StudyProgress.__table__.insert(), progress_rows)
+    db.session.commit()
+    return decks
+
+
+def main():
+    from benchmarks.common import make_bench_app
+    if len(sys.argv) < 2:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    args = [int(arg) for arg in sys.argv[2:5]]
+    app = make_bench_app(sys.argv[1])
+    with app.app_context():
+        decks = generate(*args)
+    num_decks = sum(len(deck_ids) for deck_ids in decks.values())
+    print(f"{len(decks)} users, {num_decks} decks written to {sys.argv[1]} (password: {PASSWORD})")
+
+
+if __name__ == "__main__":
+    main()
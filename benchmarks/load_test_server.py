@@ -0,0 +1,143 @@
+# benchmarks/load_test_server.py
+"""Throughput of the app under different server/worker models.
+
+Seeds a throwaway SQLite database, then for each configuration starts a real
+server process (gunicorn sync workers, gunicorn gthread workers, and the
+Flask development server) and drives it with concurrent logged-in clients
+that mostly load a study page and sometimes add a card. Images come from the
+fake generator (IMAGE_GENERATOR=fake) with FAKE_IMAGE_DELAY seconds of
+simulated provider latency, so no API keys are needed.
+
+Usage: python -m benchmarks.load_test_server [seconds] [clients]
+"""
+import json
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmarks import datagen
+from benchmarks.common import make_bench_app
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+NUM_CARDS = 200
+CSRF_INPUT = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+CONFIGS = [
+    ("gunicorn sync x2", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+     {"GUNICORN_WORKER_CLASS": "sync", "WEB_CONCURRENCY": "2"}),
+    ("gunicorn gthread 2x8", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+     {"GUNICORN_WORKER_CLASS": "gthread", "WEB_CONCURRENCY": "2", "GUNICORN_THREADS": "8"}),
+    ("flask dev server", [sys.executable, "app.py"], {"FLASK_DEBUG": "0"}),
+]
+
+
+def seed(db_path, num_clients):
+    """One user with one deck per client; returns (user_id, deck_id) pairs"""
+    app = make_bench_app(db_path)
+    with app.app_context():
+        decks = datagen.generate(num_clients, 1, NUM_CARDS)
+    return [(user_id, deck_ids[0]) for user_id, deck_ids in decks.items()]
+
+
+def start_server(command, env_overrides, db_path):
+    env = dict(os.environ, PORT=str(PORT), DATABASE_URL=f"sqlite:///{db_path}",
+               IMAGE_GENERATOR="fake", FAKE_IMAGE_DELAY=os.getenv("FAKE_IMAGE_DELAY", "0.5"),
+               GUNICORN_ACCESS_LOG="/dev/null", **env_overrides)
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{BASE_URL}/login", timeout=1).read()
+            return process
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server did not start: {' '.join(command)}")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def login(user_id):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    page = opener.open(f"{BASE_URL}/login").read().decode()
+    form = {"email": datagen.email(user_id), "password": datagen.PASSWORD,
+            "csrf_token": CSRF_INPUT.search(page).group(1)}
+    opener.open(f"{BASE_URL}/login", urllib.parse.urlencode(form).encode()).read()
+    return opener
+
+
+def client(opener, index, deck_id, stop_at, latencies, errors):
+    n = 0
+    while time.perf_counter() < stop_at:
+        n += 1
+        start = time.perf_counter()
+        try:
+            if n % 5 == 0:
+                body = json.dumps({"deck_id": deck_id, "term": f"new {index}-{n}", "definition": "added"})
+                request = urllib.request.Request(f"{BASE_URL}/api/cards/create", body.encode(),
+                                                 {"Content-Type": "application/json"})
+                opener.open(request, timeout=30).read()
+            else:
+                opener.open(f"{BASE_URL}/decks/{deck_id}/study", timeout=30).read()
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def run(label, command, env_overrides, seconds, num_clients):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="gptsd-bench-"), "load.db")
+    users = seed(db_path, num_clients)
+    process = start_server(command, env_overrides, db_path)
+    try:
+        # Log everyone in first; password hashing isn't what's being measured
+        openers = [login(user_id) for user_id, _ in users]
+        latencies, errors = [], []
+        stop_at = time.perf_counter() + seconds
+        threads = [threading.Thread(target=client, args=(openers[i], i, users[i][1], stop_at, latencies, errors))
+                   for i in range(num_clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop_server(process)
+
+    if not latencies:
+        print(f"{label:22s} no successful requests ({len(errors)} errors)")
+        return
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:22s} {len(latencies) / seconds:7.1f} req/s  "
+          f"p50 {statistics.median(latencies):6.1f} ms  p95 {p95:6.1f} ms  errors {len(errors)}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"{num_clients} clients for {seconds:.0f}s each")
+    for label, command, env_overrides in CONFIGS:
+        run(label, command, env_overrides, seconds, num_clients)
+
+
+if __name__ == "__main__":
+    main()
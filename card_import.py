@@ -0,0 +1,239 @@
+# card_import.py
+"""Bulk card import from CSV, TSV, JSON/NDJSON, Quizlet and Anki exports.
+
+Rows are parsed and validated one at a time from the upload stream and
+inserted in batched transactions; media generation is queued as image_jobs
+rows so the worker pool fans it out with bounded concurrency.
+"""
+import csv
+import io
+import json
+import logging
+import re
+
+from deck_database import db, Card
+from image_jobs import enqueue_audio_job, enqueue_image_job
+
+FORMATS = ("csv", "tsv", "json", "ndjson", "quizlet", "anki")
+BATCH_SIZE = 500
+MAX_TERM_LENGTH = 200
+MAX_REPORTED_ERRORS = 100
+
+HEADER_NAMES = {"term", "definition", "front", "back", "question", "answer"}
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+logger = logging.getLogger(__name__)
+
+
+class CardImportError(ValueError):
+    """The upload as a whole can't be parsed"""
+
+
+def detect_format(filename, first_line):
+    """Guess the format from the file extension, then from the first line"""
+    extension = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if extension in ("csv", "tsv", "json", "ndjson"):
+        return extension
+    if extension == "jsonl":
+        return "ndjson"
+
+    stripped = first_line.lstrip()
+    if stripped.startswith("#separator") or stripped.startswith("#html"):
+        return "anki"
+    if stripped.startswith("["):
+        return "json"
+    if stripped.startswith("{"):
+        return "ndjson"
+    if "\t" in first_line:
+        return "tsv"
+    return "csv"
+
+
+def _is_header(fields):
+    return len(fields) >= 2 and {f.strip().lower() for f in fields[:2]} <= HEADER_NAMES
+
+
+def _delimited_rows(lines, delimiter, comment_prefix=None, strip_html=False):
+    def content_lines():
+        for line in lines:
+            if comment_prefix and line.startswith(comment_prefix):
+                continue
+            yield line
+
+    for index, fields in enumerate(csv.reader(content_lines(), delimiter=delimiter)):
+        if not fields or not any(f.strip() for f in fields):
+            continue
+        if index == 0 and _is_header(fields):
+            continue
+        if len(fields) < 2:
+            yield None, None, "Expected a term and a definition"
+            continue
+        term, definition = fields[0], fields[1]
+        if strip_html:
+            term = TAG_PATTERN.sub("", term).replace("&nbsp;", " ")
+            definition = TAG_PATTERN.sub("", definition).replace("&nbsp;", " ")
+        yield term, definition, None
+
+
+def _record_fields(record):
+    if not isinstance(record, dict):
+        return None, None, "Expected an object"
+    term = record.get("term", record.get("front", record.get("question")))
+    definition = record.get("definition", record.get("back", record.get("answer")))
+    return term, definition, None
+
+
+def _json_rows(text):
+    try:
+        records = json.loads(text)
+    except ValueError as e:
+        raise CardImportError(f"Invalid JSON: {e}")
+    if isinstance(records, dict):
+        records = records.get("cards", [])
+    if not isinstance(records, list):
+        raise CardImportError("Expected a JSON list of cards")
+    for record in records:
+        yield _record_fields(record)
+
+
+def _ndjson_rows(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, None, "Invalid JSON"
+            continue
+        yield _record_fields(record)
+
+
+def iter_rows(stream, fmt="auto", filename=None):
+    """Yield (row_number, term, definition, error) from a text stream"""
+    first_line = stream.readline()
+    if fmt == "auto":
+        fmt = detect_format(filename, first_line)
+    if fmt not in FORMATS:
+        raise CardImportError(f"Unsupported format '{fmt}'")
+
+    def lines():
+        if first_line:
+            yield first_line
+        yield from stream
+
+    if fmt == "json":
+        rows = _json_rows(first_line + stream.read())
+    elif fmt == "ndjson":
+        rows = _ndjson_rows(lines())
+    elif fmt == "csv":
+        rows = _delimited_rows(lines(), ",")
+    elif fmt == "anki":
+        rows = _delimited_rows(lines(), "\t", comment_prefix="#", strip_html=True)
+    else:  # tsv and Quizlet's default tab-separated export
+        rows = _delimited_rows(lines(), "\t")
+
+    for number, (term, definition, error) in enumerate(rows, start=1):
+        yield number, term, definition, error
+
+
+def iter_records(records):
+    """Yield rows from an already-decoded list of {"term", "definition"} objects"""
+    if not isinstance(records, list):
+        raise CardImportError("Expected a list of cards")
+    for number, record in enumerate(records, start=1):
+        term, definition, error = _record_fields(record)
+        yield number, term, definition, error
+
+
+def validate_row(term, definition):
+    """Return cleaned (term, definition, error)"""
+    if not isinstance(term, str) or not isinstance(definition, str):
+        return None, None, "Term and definition must be text"
+    term, definition = term.strip(), definition.strip()
+    if not term or not definition:
+        return None, None, "Missing term or definition"
+    if len(term) > MAX_TERM_LENGTH:
+        return None, None, f"Term longer than {MAX_TERM_LENGTH} characters"
+    return term, definition, None
+
+
+def import_cards(deck, rows, generate_images=True, generate_audio=False,
+                 batch_size=BATCH_SIZE, on_batch=None):
+    """Insert validated rows into deck, one transaction per batch
+
+    on_batch() is called after each commit (e.g. to wake the image workers).
+    If a batch fails to commit, or the upload turns out to be unreadable,
+    after earlier batches went in, the result says so instead of raising:
+    "stopped_at_row" is the first row that wasn't imported and "error" says
+    why, so the client can resend from there without duplicating cards.
+    """
+    imported = 0
+    batches = 0
+    errors = []
+    error_count = 0
+    batch = []
+    batch_start = None  # row number of the first card in batch
+    number = 0
+
+    def flush():
+        nonlocal imported, batches
+        if not batch:
+            return
+        try:
+            db.session.add_all(batch)
+            for card in batch:
+                if generate_images:
+                    enqueue_image_job(card)
+                if generate_audio:
+                    enqueue_audio_job(card)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        imported += len(batch)
+        batches += 1
+        batch.clear()
+        if on_batch:
+            on_batch()
+
+    result = {}
+    try:
+        for number, term, definition, error in rows:
+            if not error:
+                term, definition, error = validate_row(term, definition)
+            if error:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": number, "error": error})
+                continue
+
+            if not batch:
+                batch_start = number
+            batch.append(Card(term=term, definition=definition, deck_id=deck.id))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except Exception as e:
+        if not imported:
+            raise  # nothing was committed; the caller reports the error as usual
+        logger.error(f"Card import into deck {deck.id} stopped after {imported} cards: {e}")
+        result["stopped_at_row"] = batch_start if batch else number + 1
+        if isinstance(e, CardImportError):
+            result["error"] = str(e)
+        elif isinstance(e, UnicodeDecodeError):
+            result["error"] = "File must be UTF-8 text"
+        else:
+            result["error"] = "Failed to save cards"
+
+    result.update({
+        "imported": imported,
+        "batches": batches,
+        "skipped": error_count,
+        "errors": errors,
+    })
+    return result
+
+
+def text_stream(file_storage):
+    """Decode an uploaded file lazily instead of reading it all into memory"""
+    return io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
@@ -0,0 +1,121 @@
+# card_sampler.py
+"""Random card selection that doesn't sort the whole deck.
+
+`ORDER BY RANDOM() LIMIT n` reads and sorts every card in the deck. Instead we
+pick random points in the deck's id range and seek to the next card with the
+(deck_id, id) index, so each pick costs one index lookup regardless of deck
+size. Ids that follow a gap left by deleted cards (or another deck's cards) are
+slightly more likely to be picked; when the range is too sparse to fill the
+sample, the remaining picks come from the deck's id list.
+
+With weighted=True part of the sample is drawn from the user's studied cards,
+favouring cards with lapses, low ease or an overdue review.
+
+Functions take a DB-API sqlite3 connection, like the rest of visual mode.
+"""
+import math
+import random
+from datetime import datetime
+
+from scheduler import DEFAULT_EASE, MIN_EASE
+
+# Picks per requested card before falling back to the id list
+ATTEMPTS_PER_CARD = 4
+# Share of a weighted sample drawn from studied cards; the rest are uniform
+WEAK_SHARE = 0.7
+OVERDUE_BOOST = 2.0
+MAX_LAPSES = 4
+# Weighted draws per requested card; unfilled picks fall back to uniform ones
+WEAK_ATTEMPTS_PER_CARD = 30
+
+
+def id_bounds(conn, deck_id):
+    """Lowest and highest card id in a deck, each read with one index seek"""
+    return conn.execute('''
+        SELECT (SELECT id FROM cards WHERE deck_id = ? ORDER BY id LIMIT 1),
+               (SELECT id FROM cards WHERE deck_id = ? ORDER BY id DESC LIMIT 1)
+    ''', (deck_id, deck_id)).fetchone()
+
+
+def sample_card_ids(conn, deck_id, limit, exclude=(), rng=random):
+    """Up to `limit` distinct random card ids from a deck, skipping `exclude`"""
+    if limit <= 0:
+        return []
+    low, high = id_bounds(conn, deck_id)
+    if low is None:
+        return []
+
+    seen = set(exclude)
+    picked = []
+    for _ in range(limit * ATTEMPTS_PER_CARD):
+        if len(picked) >= limit:
+            return picked
+        row = conn.execute(
+            'SELECT id FROM cards WHERE deck_id = ? AND id >= ? ORDER BY id LIMIT 1',
+            (deck_id, rng.randint(low, high))
+        ).fetchone()
+        if row and row[0] not in seen:
+            seen.add(row[0])
+            picked.append(row[0])
+
+    if len(picked) < limit:
+        # Small or sparse deck: finish from the id list (an index-only scan)
+        remaining = [row[0] for row in conn.execute('SELECT id FROM cards WHERE deck_id = ?', (deck_id,))
+                     if row[0] not in seen]
+        picked.extend(rng.sample(remaining, min(limit - len(picked), len(remaining))))
+    return picked
+
+
+def weakness(ease, lapses, overdue):
+    """Sampling weight of a studied card; higher means weaker"""
+    weight = (1 + min(lapses or 0, MAX_LAPSES)) * DEFAULT_EASE / max(ease or DEFAULT_EASE, MIN_EASE)
+    return weight * OVERDUE_BOOST if overdue else weight
+
+
+MAX_WEAKNESS = weakness(MIN_EASE, MAX_LAPSES, True)
+
+
+def sample_weak_card_ids(conn, user_id, deck_id, limit, rng=random, now=None):
+    """Up to `limit` of the user's studied cards in a deck, drawn by weakness
+
+    Rejection sampling: a random progress row (found with the same id-range
+    seek, on the (user_id, deck_id) index) is kept with probability
+    weakness / MAX_WEAKNESS, so weak cards come up more often without reading
+    the user's whole history for the deck.
+    """
+    if limit <= 0:
+        return []
+    low, high = conn.execute('''
+        SELECT (SELECT id FROM study_progress WHERE user_id = ? AND deck_id = ? ORDER BY id LIMIT 1),
+               (SELECT id FROM study_progress WHERE user_id = ? AND deck_id = ? ORDER BY id DESC LIMIT 1)
+    ''', (user_id, deck_id, user_id, deck_id)).fetchone()
+    if low is None:
+        return []
+
+    now = (now or datetime.utcnow()).strftime('%Y-%m-%d %H:%M:%S')
+    picked = []
+    seen = set()
+    for _ in range(limit * WEAK_ATTEMPTS_PER_CARD):
+        if len(picked) >= limit:
+            break
+        row = conn.execute('''
+            SELECT card_id, ease, lapses, due_at <= ?
+            FROM study_progress
+            WHERE user_id = ? AND deck_id = ? AND id >= ?
+            ORDER BY id LIMIT 1
+        ''', (now, user_id, deck_id, rng.randint(low, high))).fetchone()
+        if not row or row[0] in seen:
+            continue
+        if rng.random() * MAX_WEAKNESS < weakness(row[1], row[2], row[3]):
+            seen.add(row[0])
+            picked.append(row[0])
+    return picked
+
+
+def sample_cards(conn, user_id, deck_id, limit, weighted=False, rng=random):
+    """Card ids for a session: uniform, or mostly weak cards topped up uniformly"""
+    picked = []
+    if weighted:
+        picked = sample_weak_card_ids(conn, user_id, deck_id, math.ceil(limit * WEAK_SHARE), rng)
+    picked += sample_card_ids(conn, deck_id, limit - len(picked), exclude=picked, rng=rng)
+    return picked
@@ -0,0 +1,206 @@
+# card_search.py
+"""Full-text search over a user's cards and decks.
+
+SQLite: an external-content FTS5 table (cards_fts) over cards.term and
+cards.definition, kept in sync by triggers, so rows written by bulk Core
+inserts or the raw-sqlite visual mode are indexed too. Postgres: a generated
+tsvector column on cards with a GIN index. Other databases fall back to LIKE.
+
+Every word of the query must match the start of a word in the card ("photo
+light" finds "Photosynthesis: plants make sugar from light"), and results are
+ranked with term matches weighted above definition matches.
+"""
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+MAX_RESULTS = 100
+TERM_WEIGHT = 10.0
+DEFINITION_WEIGHT = 1.0
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+SQLITE_FTS_SETUP = (
+    """CREATE VIRTUAL TABLE cards_fts USING fts5(
+        term, definition,
+        content='cards', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+        INSERT INTO cards_fts(rowid, term, definition) VALUES (new.id, new.term, new.definition);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+        INSERT INTO cards_fts(cards_fts, rowid, term, definition)
+        VALUES ('delete', old.id, old.term, old.definition);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF term, definition ON cards BEGIN
+        INSERT INTO cards_fts(cards_fts, rowid, term, definition)
+        VALUES ('delete', old.id, old.term, old.definition);
+        INSERT INTO cards_fts(rowid, term, definition) VALUES (new.id, new.term, new.definition);
+    END""",
+    # Index the cards that existed before the FTS table
+    "INSERT INTO cards_fts(cards_fts) VALUES ('rebuild')",
+)
+
+POSTGRES_SETUP = (
+    """ALTER TABLE cards ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(term, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(definition, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_cards_search_vector ON cards USING GIN (search_vector)",
+)
+
+
+def _has_fts_table(conn):
+    return conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cards_fts'"
+    )).first() is not None
+
+
+def ensure_index(engine):
+    """Create the search index and its sync triggers if they don't exist yet"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        try:
+            with engine.begin() as conn:
+                if _has_fts_table(conn):
+                    return
+                for statement in SQLITE_FTS_SETUP:
+                    conn.execute(text(statement))
+        except OperationalError as e:
+            # SQLite built without FTS5; search_cards() falls back to LIKE
+            logger.warning(f"Full-text search unavailable: {e}")
+    elif dialect == "postgresql":
+        with engine.begin() as conn:
+            for statement in POSTGRES_SETUP:
+                conn.execute(text(statement))
+
+
+def query_words(query):
+    """Words of a search query, lowercased; punctuation and FTS operators are dropped"""
+    return [word.lower() for word in WORD_PATTERN.findall(query or "")]
+
+
+def fts5_query(words):
+    """Every word as a quoted prefix term, e.g. '"photo"* "syn"*'"""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def tsquery(words):
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _card_row(row):
+    return {
+        "id": row.id,
+        "deck_id": row.deck_id,
+        "deck_name": row.deck_name,
+        "term": row.term,
+        "definition": row.definition,
+        "image_url": row.image_url,
+    }
+
+
+def _search_cards_sqlite(session, user_id, words, limit):
+    rows = session.execute(text("""
+        SELECT c.id, c.deck_id, d.name AS deck_name, c.term, c.definition, c.image_url
+        FROM cards_fts
+        JOIN cards c ON c.id = cards_fts.rowid
+        JOIN decks d ON d.id = c.deck_id
+        WHERE cards_fts MATCH :query AND d.owner_id = :user_id
+        ORDER BY bm25(cards_fts, :term_weight, :definition_weight)
+        LIMIT :limit
+    """), {
+        "query": fts5_query(words), "user_id": user_id, "limit": limit,
+        "term_weight": TERM_WEIGHT, "definition_weight": DEFINITION_WEIGHT,
+    })
+    return [_card_row(row) for row in rows]
+
+
+def _search_cards_postgres(session, user_id, words, limit):
+    rows = session.execute(text("""
+        SELECT c.id, c.deck_id, d.name AS deck_name, c.term, c.definition, c.image_url
+        FROM cards c
+        JOIN decks d ON d.id = c.deck_id
+        WHERE c.search_vector @@ to_tsquery('simple', :query) AND d.owner_id = :user_id
+        ORDER BY ts_rank_cd(c.search_vector, to_tsquery('simple', :query)) DESC
+        LIMIT :limit
+    """), {"query": tsquery(words), "user_id": user_id, "limit": limit})
+    return [_card_row(row) for row in rows]
+
+
+def _search_cards_like(session, user_id, words, limit):
+    conditions = []
+    params = {"user_id": user_id, "limit": limit}
+    for i, word in enumerate(words):
+        conditions.append(f"(lower(c.term) LIKE :w{i} OR lower(c.definition) LIKE :w{i})")
+        params[f"w{i}"] = f"%{word}%"
+    rows = session.execute(text(f"""
+        SELECT c.id, c.deck_id, d.name AS deck_name, c.term, c.definition, c.image_url
+        FROM cards c
+        JOIN decks d ON d.id = c.deck_id
+        WHERE d.owner_id = :user_id AND {' AND '.join(conditions)}
+        ORDER BY c.id
+        LIMIT :limit
+    """), params)
+    return [_card_row(row) for row in rows]
+
+
+def search_cards(session, user_id, query, limit=20):
+    """Ranked cards owned by user_id whose term or definition match every query word"""
+    words = query_words(query)
+    if not words:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite" and _has_fts_table(session):
+        return _search_cards_sqlite(session, user_id, words, limit)
+    if dialect == "postgresql":
+        return _search_cards_postgres(session, user_id, words, limit)
+    return _search_cards_like(session, user_id, words, limit)
+
+
+def search_decks(session, user_id, query, limit=20):
+    """The user's decks whose name, description or category contain every query word
+
+    A user has at most a few hundred decks, so this scans them through the
+    owner_id filter rather than keeping a second full-text index.
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    conditions = []
+    params = {"user_id": user_id, "limit": max(1, min(limit, MAX_RESULTS))}
+    for i, word in enumerate(words):
+        conditions.append(
+            f"(lower(name) LIKE :w{i} OR lower(coalesce(description, '')) LIKE :w{i}"
+            f" OR lower(coalesce(category, '')) LIKE :w{i})"
+        )
+        params[f"w{i}"] = f"%{word}%"
+    rows = session.execute(text(f"""
+        SELECT id, name, description, category,
+               CASE WHEN lower(name) LIKE :first THEN 0 ELSE 1 END AS name_rank
+        FROM decks
+        WHERE owner_id = :user_id AND {' AND '.join(conditions)}
+        ORDER BY name_rank, name
+        LIMIT :limit
+    """), dict(params, first=f"{words[0]}%"))
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "category": row.category,
+    } for row in rows]
+
+
+def search(session, user_id, query, limit=20):
+    """Cards and decks matching query, for the /search endpoints"""
+    return {
+        "query": query or "",
+        "cards": search_cards(session, user_id, query, limit),
+        "decks": search_decks(session, user_id, query, limit),
+    }
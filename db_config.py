@@ -0,0 +1,88 @@
+# db_config.py
+"""Engine configuration shared by every module that touches deck.db.
+
+SQLite connections get WAL journaling, a busy timeout and a few pragmas so
+concurrent study-progress writes wait for the lock instead of failing with
+"database is locked". Other databases (e.g. Postgres via DATABASE_URL) get
+a sized, pre-pinged connection pool.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URL = "sqlite:///deck.db"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+
+def database_url():
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return {
+            "connect_args": {
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+                "check_same_thread": False,
+            },
+        }
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@event.listens_for(Engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
+
+def configure_app(app, url=None):
+    """Point a Flask app at the shared database; call before db.init_app/SQLAlchemy(app)"""
+    url = url or database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+
+
+def sqlite_path(app, url=None):
+    """Filesystem path of the SQLite database, resolved the way Flask-SQLAlchemy does
+
+    Relative paths live in the app's instance folder.
+    """
+    url = make_url(url or database_url())
+    if url.get_backend_name() != "sqlite":
+        raise RuntimeError(f"{url.get_backend_name()} database has no local file")
+    if not url.database or url.database == ":memory:" or os.path.isabs(url.database):
+        return url.database
+    return os.path.join(app.instance_path, url.database)
+
+
+def connect_sqlite(path):
+    """Raw sqlite3 connection with the same timeout and pragmas as the app's engine"""
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    apply_sqlite_pragmas(conn)
+    return conn
@@ -1,8 +1,11 @@
 # deck_database.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
 from datetime import datetime
+import json
+from sqlalchemy import case, event, func, inspect, text
+from sqlalchemy.orm import Session
 
 db = SQLAlchemy()
 
@@ -10,19 +13,26 @@ class User(UserMixin, db.Model):
     __tablename__ = "users"
     id            = db.Column(db.Integer, primary_key=True)
     email         = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     name          = db.Column(db.String(100), nullable=False)
     created_at    = db.Column(db.DateTime, default=datetime.utcnow)
     is_active     = db.Column(db.Boolean, default=True)
     decks         = db.relationship("Deck", back_populates="owner", lazy="dynamic", cascade="all, delete-orphan")
 
     def set_password(self, password):
-        """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        """Hash and set the user's password with the current policy (see passwords.py)"""
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
         """Check if the provided password matches the hash"""
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
+
+    def rehash_password(self, password):
+        """Re-hash a just-verified password if the policy changed; returns True if it did (caller commits)"""
+        if not passwords.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
 
     def get_id(self):
         """Return the user ID as a string (required by Flask-Login)"""
@@ -40,7 +50,7 @@ class Deck(db.Model):
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at  = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_public   = db.Column(db.Boolean, default=False)
-    owner_id    = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    owner_id    = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     owner       = db.relationship("User", back_populates="decks")
     cards       = db.relationship("Card", back_populates="deck", lazy="dynamic", cascade="all, delete-orphan")
 
@@ -49,9 +59,18 @@ class Deck(db.Model):
         """Get the number of cards in this deck"""
         return self.cards.count()
 
-    def mastery_percentage(self, user_id):
+    @staticmethod
+    def _mastery(studied_cards, card_count):
+        if card_count == 0:
+            return 0
+        percentage = int((studied_cards / card_count) * 100)
+        return min(100, max(0, percentage))
+
+    def mastery_percentage(self, user_id, card_count=None):
         """Calculate mastery percentage based on user's study progress"""
-        if self.card_count == 0:
+        if card_count is None:
+            card_count = self.card_count
+        if card_count == 0:
             return 0
         
         # Count how many cards in this deck the user has studied
@@ -60,23 +79,95 @@ class Deck(db.Model):
             deck_id=self.id
         ).count()
         
-        # Calculate percentage
-        percentage = int((studied_cards / self.card_count) * 100)
-        return min(100, max(0, percentage))
+        return self._mastery(studied_cards, card_count)
 
-    def to_dict(self, user_id=None):
-        """Convert deck to dictionary for JSON serialization"""
+    def _summary(self, card_count, mastery):
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'category': self.category,
-            'card_count': self.card_count,
-            'mastery': self.mastery_percentage(user_id) if user_id else 0,
+            'card_count': card_count,
+            'mastery': mastery,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_dict(self, user_id=None):
+        """Convert deck to dictionary for JSON serialization"""
+        card_count = self.card_count
+        mastery = self.mastery_percentage(user_id, card_count) if user_id else 0
+        return self._summary(card_count, mastery)
+
+    @classmethod
+    def summaries(cls, owner_id, user_id=None):
+        """to_dict() for every deck a user owns, computed in a single aggregated query"""
+        user_id = user_id or owner_id
+
+        # Only this owner's decks: the join keeps a cache miss from scanning every card
+        card_counts = (
+            db.session.query(Card.deck_id, func.count(Card.id).label('card_count'))
+            .join(cls, cls.id == Card.deck_id)
+            .filter(cls.owner_id == owner_id)
+            .group_by(Card.deck_id)
+            .subquery()
+        )
+        studied_counts = (
+            db.session.query(StudyProgress.deck_id, func.count(StudyProgress.id).label('studied'))
+            .filter(StudyProgress.user_id == user_id)
+            .group_by(StudyProgress.deck_id)
+            .subquery()
+        )
+        rows = (
+            db.session.query(
+                cls,
+                func.coalesce(card_counts.c.card_count, 0),
+                func.coalesce(studied_counts.c.studied, 0),
+            )
+            .outerjoin(card_counts, card_counts.c.deck_id == cls.id)
+            .outerjoin(studied_counts, studied_counts.c.deck_id == cls.id)
+            .filter(cls.owner_id == owner_id)
+            .order_by(cls.id)
+            .all()
+        )
+        return [deck._summary(card_count, cls._mastery(studied, card_count))
+                for deck, card_count, studied in rows]
+
+    @classmethod
+    def page_version(cls, deck_id, user_id):
+        """(updated_at, card count, studied count) for a user's deck, or None if not theirs
+
+        Everything the study/quiz pages show changes one of these, so they make
+        the page's ETag without loading the deck or its cards.
+        """
+        card_count = (
+            db.session.query(func.count(Card.id)).filter(Card.deck_id == cls.id).scalar_subquery()
+        )
+        studied = (
+            db.session.query(func.count(StudyProgress.id))
+            .filter(StudyProgress.user_id == user_id, StudyProgress.deck_id == cls.id)
+            .scalar_subquery()
+        )
+        return (
+            db.session.query(cls.updated_at, card_count, studied)
+            .filter(cls.id == deck_id, cls.owner_id == user_id)
+            .first()
+        )
+
+    @classmethod
+    def list_version(cls, owner_id):
+        """(deck count, latest updated_at, studied count) for the /home deck list"""
+        studied = (
+            db.session.query(func.count(StudyProgress.id))
+            .filter(StudyProgress.user_id == owner_id)
+            .scalar_subquery()
+        )
+        return (
+            db.session.query(func.count(cls.id), func.max(cls.updated_at), studied)
+            .filter(cls.owner_id == owner_id)
+            .one()
+        )
+
     def __repr__(self):
         return f'<Deck {self.name}>'
 
@@ -89,20 +180,47 @@ class Card(db.Model):
     audio_url   = db.Column(db.String(500))
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at  = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    image_status = db.Column(db.String(20), default="ready")
+    image_variants = db.Column(db.Text)  # JSON from image_variants.variants_for_url
     deck_id     = db.Column(db.Integer, db.ForeignKey("decks.id"), nullable=False)
     deck        = db.relationship("Deck", back_populates="cards")
+    image_jobs  = db.relationship("ImageJob", back_populates="card", cascade="all, delete-orphan")
+
+    # (deck_id, id) serves both per-deck lookups and keyset pagination in id order
+    __table_args__ = (db.Index('ix_cards_deck_id_id', 'deck_id', 'id'),)
+
+    FIELDS = ('id', 'term', 'definition', 'image_url', 'image_status', 'image_variants',
+              'audio_url', 'created_at', 'updated_at')
+
+    @staticmethod
+    def serialize_field(name, value):
+        """JSON-friendly form of a single column value"""
+        if name == 'image_status':
+            return value or 'ready'
+        if name == 'image_variants':
+            return json.loads(value) if value else None
+        if name in ('created_at', 'updated_at'):
+            return value.isoformat() if value else None
+        return value
 
     def to_dict(self):
         """Convert card to dictionary for JSON serialization"""
-        return {
-            'id': self.id,
-            'term': self.term,
-            'definition': self.definition,
-            'image_url': self.image_url,
-            'audio_url': self.audio_url,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return {name: self.serialize_field(name, getattr(self, name)) for name in self.FIELDS}
+
+    @classmethod
+    def keyset_query(cls, deck_id, after_id=None, fields=FIELDS):
+        """Cards of a deck in id order, starting after after_id, selecting only fields
+
+        Rows are plain tuples (no ORM hydration); turn them into dicts with row_to_dict.
+        """
+        query = db.session.query(*[getattr(cls, name) for name in fields]).filter(cls.deck_id == deck_id)
+        if after_id:
+            query = query.filter(cls.id > after_id)
+        return query.order_by(cls.id)
+
+    @classmethod
+    def row_to_dict(cls, row, fields=FIELDS):
+        return {name: cls.serialize_field(name, value) for name, value in zip(fields, row)}
 
     def __repr__(self):
         return f'<Card {self.term}>'
@@ -114,6 +232,14 @@ class StudyProgress(db.Model):
     card_id = db.Column(db.Integer, db.ForeignKey("cards.id"), nullable=False)
     deck_id = db.Column(db.Integer, db.ForeignKey("decks.id"), nullable=False)
     studied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Spaced-repetition schedule (see scheduler.py)
+    ease = db.Column(db.Float, default=2.5)
+    interval_days = db.Column(db.Float, default=0)
+    repetitions = db.Column(db.Integer, default=0)
+    lapses = db.Column(db.Integer, default=0)
+    due_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_reviewed_at = db.Column(db.DateTime)
     
     # Relationships
     user = db.relationship("User")
@@ -121,9 +247,165 @@ class StudyProgress(db.Model):
     deck = db.relationship("Deck")
     
     # Unique constraint to prevent duplicate progress entries
-    __table_args__ = (db.UniqueConstraint('user_id', 'card_id', name='unique_user_card_progress'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'card_id', name='unique_user_card_progress'),
+        db.Index('ix_study_progress_user_deck', 'user_id', 'deck_id'),
+        db.Index('ix_study_progress_user_due', 'user_id', 'due_at'),
+    )
     
+    @classmethod
+    def upsert_studied(cls, user_id, studied):
+        """Mark many cards studied with one INSERT ... ON CONFLICT statement (caller commits)
+
+        studied is a list of (card_id, deck_id, studied_at); existing rows keep the
+        later of the two timestamps and their review schedule.
+        """
+        if not studied:
+            return
+        if db.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        table = cls.__table__
+        stmt = insert(table).values([{
+            'user_id': user_id,
+            'card_id': card_id,
+            'deck_id': deck_id,
+            'studied_at': studied_at,
+            'ease': 2.5,
+            'interval_days': 0,
+            'repetitions': 0,
+            'lapses': 0,
+            'due_at': studied_at,
+        } for card_id, deck_id, studied_at in studied])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'card_id'],
+            set_={'studied_at': case(
+                (stmt.excluded.studied_at > func.coalesce(table.c.studied_at, stmt.excluded.studied_at),
+                 stmt.excluded.studied_at),
+                else_=func.coalesce(table.c.studied_at, stmt.excluded.studied_at),
+            )},
+        )
+        db.session.execute(stmt)
+
     def __repr__(self):
         return f'<StudyProgress user_id={self.user_id} card_id={self.card_id}>'
 
+class ImageJob(db.Model):
+    """Pending AI image (or TTS audio) generation for a card, drained by image_jobs workers"""
+    __tablename__ = "image_jobs"
+    id          = db.Column(db.Integer, primary_key=True)
+    card_id     = db.Column(db.Integer, db.ForeignKey("cards.id"), nullable=False, index=True)
+    kind        = db.Column(db.String(10), default="image")
+    status      = db.Column(db.String(20), nullable=False, default="pending")
+    attempts    = db.Column(db.Integer, nullable=False, default=0)
+    error       = db.Column(db.Text)
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at  = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    run_after   = db.Column(db.DateTime)  # retry backoff: not claimed before this time
+    shared_with = db.Column(db.Text)  # JSON list of card ids with the same term, filled from this job's result
+    card        = db.relationship("Card", back_populates="image_jobs")
+
+    __table_args__ = (db.Index('ix_image_jobs_status_id', 'status', 'id'),)
+
+    def __repr__(self):
+        return f'<ImageJob card_id={self.card_id} status={self.status}>'
+
+class ImageCacheEntry(db.Model):
+    """Generated image for a normalized prompt; files are stored by content hash"""
+    __tablename__ = "image_cache"
+    id           = db.Column(db.Integer, primary_key=True)
+    prompt_hash  = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    image_url    = db.Column(db.String(500), nullable=False)
+    hit_count    = db.Column(db.Integer, nullable=False, default=0)
+    created_at   = db.Column(db.DateTime, default=datetime.utcnow)
+    last_hit_at  = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ImageCacheEntry {self.prompt_hash[:12]} -> {self.image_url}>'
+
+class QuizAttempt(db.Model):
+    """One graded quiz answer; the typed text itself isn't kept"""
+    __tablename__ = "quiz_attempts"
+    id          = db.Column(db.Integer, primary_key=True)
+    user_id     = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    deck_id     = db.Column(db.Integer, db.ForeignKey("decks.id"), nullable=False)
+    card_id     = db.Column(db.Integer, db.ForeignKey("cards.id"), nullable=False)
+    correct     = db.Column(db.Boolean, nullable=False)
+    distance    = db.Column(db.SmallInteger)  # edit distance when close enough to count
+    answered_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_quiz_attempts_user_deck', 'user_id', 'deck_id'),)
+
+    @classmethod
+    def record(cls, user_id, deck_id, results, answered_at=None):
+        """Insert (card_id, correct, distance) results in one executemany (caller commits)"""
+        if not results:
+            return
+        answered_at = answered_at or datetime.utcnow()
+        db.session.execute(cls.__table__.insert(), [{
+            'user_id': user_id,
+            'deck_id': deck_id,
+            'card_id': card_id,
+            'correct': correct,
+            'distance': distance,
+            'answered_at': answered_at,
+        } for card_id, correct, distance in results])
+
+    def __repr__(self):
+        return f'<QuizAttempt user_id={self.user_id} card_id={self.card_id} correct={self.correct}>'
+
+class UserStats(db.Model):
+    """Per-user dashboard totals, kept current by user_stats on every write"""
+    __tablename__ = "user_stats"
+    user_id         = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    deck_count      = db.Column(db.Integer, nullable=False, default=0)
+    card_count      = db.Column(db.Integer, nullable=False, default=0)
+    studied_count   = db.Column(db.Integer, nullable=False, default=0)
+    quiz_correct    = db.Column(db.Integer, nullable=False, default=0)
+    quiz_attempts   = db.Column(db.Integer, nullable=False, default=0)
+    current_streak  = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak  = db.Column(db.Integer, nullable=False, default=0)
+    last_study_date = db.Column(db.Date)
+    updated_at      = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserStats user_id={self.user_id}>'
+
+@event.listens_for(Session, "after_flush")
+def bump_deck_versions(session, flush_context):
+    """Touch Deck.updated_at when any of its cards was added, edited or deleted"""
+    deck_ids = {obj.deck_id for obj in session.new | session.deleted if isinstance(obj, Card)}
+    deck_ids.update(obj.deck_id for obj in session.dirty
+                    if isinstance(obj, Card) and session.is_modified(obj, include_collections=False))
+    deck_ids.discard(None)
+    if deck_ids:
+        session.connection().execute(
+            Deck.__table__.update()
+            .where(Deck.__table__.c.id.in_(deck_ids))
+            .values(updated_at=datetime.utcnow())
+        )
 
+def upgrade_schema():
+    """Add columns and indexes that db.create_all() won't add to existing tables, and widen outgrown ones"""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        # scrypt and argon2 hashes (see passwords.py) outgrow the original VARCHAR(128)
+        if conn.dialect.name == "postgresql" and inspector.has_table("users"):
+            column = next(c for c in inspector.get_columns("users") if c["name"] == "password_hash")
+            if (getattr(column["type"], "length", None) or 255) < 255:
+                conn.execute(text("ALTER TABLE users ALTER COLUMN password_hash TYPE VARCHAR(255)"))
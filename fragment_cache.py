@@ -0,0 +1,243 @@
+# fragment_cache.py
+"""Application-level cache for per-user deck summaries and per-deck card windows.
+
+Entries live under a scope ("user:<id>" or "deck:<id>") whose generation
+number is part of every key, so invalidating a scope is a single counter bump
+and stale entries simply age out. Card, Deck and StudyProgress mapper events
+record which scopes a flush touched; the bumps are applied once the
+transaction commits, so a concurrent request can't re-cache pre-commit data.
+Writes that bypass the ORM call invalidate_on_commit() themselves.
+
+Generations only move in the process that committed, so callers also pass
+the database version of what they cache (Deck.list_version() for a user's
+decks, Deck.updated_at for a deck's cards). It is part of the key, which
+keeps other gunicorn workers and `flask image-worker` processes from
+serving entries older than the database, whichever backend is in use.
+
+LRUBackend keeps entries in this process, bounded by entry count and by total
+cost (the number of cards/decks held). RedisBackend shares entries between
+processes through a redis-py compatible client; session_store.FakeRedis
+stands in for a server locally.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from deck_database import Card, Deck, StudyProgress
+
+MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "2048"))
+MAX_COST = int(os.getenv("FRAGMENT_CACHE_MAX_COST", "200000"))
+REDIS_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "3600"))
+
+PENDING_KEY = "fragment_cache_pending"
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def deck_scope(deck_id):
+    return f"deck:{deck_id}"
+
+
+class LRUBackend:
+    """In-process LRU bounded by entry count and total cost"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_cost=MAX_COST):
+        self.max_entries = max_entries
+        self.max_cost = max_cost
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, cost), least recently used first
+        self._cost = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, cost=1):
+        if cost > self.max_cost:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._cost -= old[1]
+            self._entries[key] = (value, cost)
+            self._cost += cost
+            while len(self._entries) > self.max_entries or self._cost > self.max_cost:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._cost -= evicted_cost
+                self.evictions += 1
+
+    def generation(self, scope):
+        return self._generations.get(scope, 0)
+
+    def bump(self, scope):
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def stats(self):
+        return {"entries": len(self._entries), "cost": self._cost,
+                "max_entries": self.max_entries, "max_cost": self.max_cost}
+
+
+class RedisBackend:
+    """JSON entries with a TTL in a redis-py compatible client"""
+
+    evictions = 0  # Redis evicts on its own (maxmemory-policy); we can't count it
+
+    def __init__(self, client, prefix="fragment:", ttl=REDIS_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, cost=1):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def generation(self, scope):
+        raw = self.client.get(f"{self.prefix}gen:{scope}")
+        return int(raw) if raw is not None else 0
+
+    def bump(self, scope):
+        self.client.incr(f"{self.prefix}gen:{scope}")
+
+    def stats(self):
+        return {}
+
+
+class FragmentCache:
+    """get_or_compute() with scope-based invalidation and hit/miss counters"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUBackend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, scope, key, version=()):
+        full_key = f"{scope}:{self.backend.generation(scope)}:{key}"
+        return f"{full_key}@{'/'.join(map(str, version))}" if version else full_key
+
+    def get_or_compute(self, scope, key, compute, cost=None, version=()):
+        """Cached value for key within scope, computing and storing it on a miss
+
+        version is a tuple read from the database that changes whenever the
+        value would; cost defaults to len(value) for lists/dicts. Callers must
+        not mutate the returned value.
+        """
+        full_key = self._key(scope, key, version)
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        if cost is None:
+            cost = max(1, len(value)) if isinstance(value, (list, dict)) else 1
+        self.backend.set(full_key, value, cost)
+        return value
+
+    def invalidate(self, *scopes):
+        for scope in set(scopes):
+            self.backend.bump(scope)
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(self.backend.stats(), **{
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+        })
+
+
+def backend_from_env():
+    """Backend named by FRAGMENT_CACHE_BACKEND: memory (default), redis or fakeredis"""
+    name = os.getenv("FRAGMENT_CACHE_BACKEND", "memory").lower()
+    if name == "redis":
+        import redis  # only needed when the cache is shared through a Redis server
+        return RedisBackend(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    if name == "fakeredis":
+        from session_store import FakeRedis
+        return RedisBackend(FakeRedis())
+    return LRUBackend()
+
+
+cache = FragmentCache(backend_from_env())
+
+
+# Invalidation: mapper events note what changed, after_commit applies it
+
+def _pending(session):
+    return session.info.setdefault(PENDING_KEY, {"scopes": set(), "decks": set()})
+
+
+def invalidate_on_commit(session, *scopes):
+    """Invalidate scopes once session's transaction commits (for writes that bypass the ORM)"""
+    _pending(session)["scopes"].update(scopes)
+
+
+def _card_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        # The deck owner's summaries change too; owners are resolved after the flush
+        _pending(session)["decks"].add(target.deck_id)
+
+
+def _deck_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _pending(session)["scopes"].update((deck_scope(target.id), user_scope(target.owner_id)))
+
+
+def _progress_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _pending(session)["scopes"].add(user_scope(target.user_id))
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Card, _event, _card_changed)
+    event.listen(Deck, _event, _deck_changed)
+    event.listen(StudyProgress, _event, _progress_changed)
+
+
+@event.listens_for(Session, "after_flush")
+def _resolve_deck_owners(session, flush_context):
+    pending = session.info.get(PENDING_KEY)
+    if not pending or not pending["decks"]:
+        return
+    deck_ids = pending["decks"] - {None}
+    pending["decks"] = set()
+    pending["scopes"].update(deck_scope(deck_id) for deck_id in deck_ids)
+    owners = session.connection().execute(
+        select(Deck.owner_id).where(Deck.id.in_(deck_ids)).distinct()
+    ).scalars()
+    pending["scopes"].update(user_scope(owner_id) for owner_id in owners)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending and pending["scopes"]:
+        cache.invalidate(*pending["scopes"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,75 @@
+# gunicorn.conf.py
+"""Gunicorn settings for serving wsgi:app.
+
+Requests mostly wait on SQLite/Postgres, and on Gemini and Watson when media
+is generated inline (/synthesize), so each process runs a pool of threads
+rather than relying on more processes. Every environment variable below can
+override the default.
+"""
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Processes x threads: CPU-bound work is small, I/O waits are long
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count() * 2, 8))))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Image generation can take a while; give in-flight jobs time to finish on shutdown.
+# The master SIGKILLs a worker graceful_timeout after SIGTERM, so by default that
+# covers a whole Gemini call (OUTBOUND_GEMINI_DEADLINE, 120s in outbound.py)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv(
+    "GUNICORN_GRACEFUL_TIMEOUT", str(int(float(os.getenv("OUTBOUND_GEMINI_DEADLINE", "120"))) + 10)
+))
+# Finish draining this long before the master's kill
+KILL_MARGIN = 2.0
+keepalive = 5
+
+# Each worker process imports wsgi and starts its own image workers after the
+# fork; starting threads in a preloaded master wouldn't survive forking
+preload_app = False
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    """Create and upgrade the schema once, before any worker starts
+
+    Runs in a child process so the master never imports the app (workers
+    would inherit its database connections). Workers then skip init_db().
+    """
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], check=True)
+    os.environ["INIT_DB"] = "0"
+
+
+def post_worker_init(worker):
+    """Stop claiming image jobs as soon as SIGTERM arrives, not after HTTP has drained"""
+    from app import image_workers
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        worker.kill_deadline = time.monotonic() + graceful_timeout
+        image_workers.request_stop()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_int(worker):
+    """SIGINT/SIGQUIT: quick shutdown, claim nothing more"""
+    from app import image_workers
+    image_workers.request_stop()
+
+
+def worker_exit(server, worker):
+    """Drain this process's image workers in what is left of the shutdown window"""
+    from app import shutdown
+    deadline = getattr(worker, "kill_deadline", time.monotonic() + graceful_timeout)
+    shutdown(timeout=max(0.0, deadline - KILL_MARGIN - time.monotonic()))
@@ -2,13 +2,14 @@ from flask import Flask, render_template, redirect, url_for, flash, session, req
 from flask_sqlalchemy import SQLAlchemy
 import os
 from dotenv import load_dotenv
+import db_config
+import card_search
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///deck.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db_config.configure_app(app)
 
 db = SQLAlchemy(app)
 
@@ -66,10 +67,16 @@ def api_dashboard():
 
 @app.route("/search")
 def search():
-    pass
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not logged in"}), 401
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(card_search.search(db.session, user.id, query, limit))
 
 if __name__=="__main__":
     with app.app_context():
         db.create_all()
+        card_search.ensure_index(db.engine)
     app.run(debug=True)
 
@@ -0,0 +1,52 @@
+# http_cache.py
+"""Strong ETags and conditional GETs for the server-rendered pages.
+
+A page's ETag is a hash of the data versions it was rendered from (deck
+updated_at, card and studied counts, ...) plus a fingerprint of the
+templates, so a deploy that changes a template also changes every ETag.
+When the browser revalidates with a matching If-None-Match we answer 304
+before loading any rows or rendering anything.
+
+Deck.updated_at is bumped whenever one of the deck's cards is added, edited
+or deleted (see deck_database.bump_deck_versions), so it doubles as the
+deck's content version.
+"""
+import hashlib
+import os
+
+from flask import current_app, make_response, request
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+def _template_fingerprint(directory=TEMPLATE_DIR):
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
+
+TEMPLATE_VERSION = _template_fingerprint()
+
+
+def make_etag(*parts):
+    """Strong ETag value for a page rendered from the given version parts"""
+    payload = "|".join([TEMPLATE_VERSION] + [str(part) for part in parts])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def conditional(etag, render):
+    """304 if the client already has this version, otherwise render() it
+
+    Either way the response carries the ETag and must be revalidated on every
+    visit, so a stale page is never shown without asking the server.
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
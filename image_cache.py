@@ -0,0 +1,109 @@
+# image_cache.py
+"""Content-addressed cache for AI-generated card images.
+
+Lookups are keyed by a hash of the normalized prompt, so the same term and
+definition never hit Gemini twice. Image files are named by the hash of their
+bytes, so identical images are only stored once on disk.
+
+A hit only writes to the database when the entry's last_hit_at is older
+than TOUCH_INTERVAL; hits in between are counted in memory and added to
+hit_count with that write, so hot prompts don't queue on the write lock.
+"""
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from deck_database import db, ImageCacheEntry
+
+IMAGE_DIR = os.path.join("static", "images")
+TOUCH_INTERVAL = timedelta(seconds=int(os.getenv("IMAGE_CACHE_TOUCH_INTERVAL", "3600")))
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stored": 0, "deduplicated": 0}
+_unrecorded_hits = {}  # entry id -> hits not yet added to hit_count
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Hit/miss counters for this process"""
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+    return counters
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt"""
+    return " ".join(prompt.lower().split())
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def lookup(prompt):
+    """Return the cached image URL for a prompt, or None"""
+    entry = ImageCacheEntry.query.filter_by(prompt_hash=prompt_key(prompt)).first()
+    if not entry:
+        _count("misses")
+        return None
+
+    _count("hits")
+    now = datetime.utcnow()
+    with _stats_lock:
+        hits = _unrecorded_hits.pop(entry.id, 0) + 1
+        if entry.last_hit_at and now - entry.last_hit_at < TOUCH_INTERVAL:
+            _unrecorded_hits[entry.id] = hits
+            return entry.image_url
+    ImageCacheEntry.query.filter_by(id=entry.id).update({
+        "hit_count": ImageCacheEntry.hit_count + hits,
+        "last_hit_at": now,
+    }, synchronize_session=False)
+    db.session.commit()
+    return entry.image_url
+
+
+def store(prompt, image_bytes, extension="png"):
+    """Save generated image bytes (deduplicated by content) and cache them for the prompt"""
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+    filename = f"{content_hash[:32]}.{extension}"
+    filepath = os.path.join(IMAGE_DIR, filename)
+
+    if os.path.exists(filepath):
+        _count("deduplicated")
+    else:
+        os.makedirs(IMAGE_DIR, exist_ok=True)
+        # Write to a temp file first so readers never see a partial image
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, filepath)
+        _count("stored")
+
+    image_url = f"/static/images/{filename}"
+    entry = ImageCacheEntry(
+        prompt_hash=prompt_key(prompt),
+        content_hash=content_hash,
+        image_url=image_url,
+    )
+    try:
+        db.session.add(entry)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker cached this prompt first; keep theirs
+        db.session.rollback()
+        existing = ImageCacheEntry.query.filter_by(prompt_hash=entry.prompt_hash).first()
+        if existing:
+            return existing.image_url
+    return image_url
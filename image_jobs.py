@@ -0,0 +1,409 @@
+# image_jobs.py
+"""Background media generation.
+
+Cards are committed straight away with image_status='pending' and an ImageJob
+row. Worker threads drain the image_jobs table and fill in Card.image_url (or
+Card.audio_url for kind='audio' jobs), so request threads never wait on Gemini
+or Watson.
+
+prepare_deck_media() queues everything a deck is missing in one go, one job
+per distinct term, so a teacher can warm a deck before a class opens it.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from deck_database import db, Card, ImageJob
+
+MAX_ATTEMPTS = 3
+# Failed attempts wait JOB_RETRY_DELAY, then twice that, ... before running again,
+# so a short provider outage doesn't use up every attempt at once
+RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "30"))
+# A 'running' job older than this is assumed to belong to a dead worker; keep it
+# well above the longest generation (provider timeouts x retries)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+REQUEUE_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_image_job(card):
+    """Mark a card as waiting for an image and queue a job for it (caller commits)"""
+    card.image_status = "pending"
+    job = ImageJob(card=card, kind="image")
+    db.session.add(job)
+    return job
+
+
+def enqueue_audio_job(card):
+    """Queue speech synthesis for a card's term (caller commits)"""
+    job = ImageJob(card=card, kind="audio")
+    db.session.add(job)
+    return job
+
+
+def queue_missing_images(cards):
+    """Queue jobs for cards that have no image and none on the way (caller commits)"""
+    queued = 0
+    for card in cards:
+        if card.image_url or card.image_status in ("pending", "failed"):
+            continue
+        enqueue_image_job(card)
+        queued += 1
+    return queued
+
+
+def media_key(term):
+    """Terms that get the same image and audio: case and whitespace don't matter"""
+    return " ".join((term or "").split()).casefold()
+
+
+def _active_card_ids(deck_id, kind):
+    """Cards of a deck with a pending or running job of this kind, directly or shared"""
+    jobs = (ImageJob.query
+            .join(Card, ImageJob.card_id == Card.id)
+            .filter(Card.deck_id == deck_id,
+                    ImageJob.kind == kind,
+                    ImageJob.status.in_(["pending", "running"]))
+            .with_entities(ImageJob.card_id, ImageJob.shared_with))
+    card_ids = set()
+    for card_id, shared_with in jobs:
+        card_ids.add(card_id)
+        card_ids.update(json.loads(shared_with) if shared_with else ())
+    return card_ids
+
+
+def _fan_out(cards, kind, enqueue):
+    """Queue one job per distinct term; later cards with that term share its result
+
+    Returns (jobs queued, cards attached to another card's job).
+    """
+    leaders = {}
+    shared = 0
+    for card in cards:
+        key = media_key(card.term)
+        job = leaders.get(key)
+        if job is None:
+            leaders[key] = enqueue(card)
+            continue
+        job.shared_with = json.dumps(json.loads(job.shared_with or "[]") + [card.id])
+        if kind == "image":
+            card.image_status = "pending"
+        shared += 1
+    return len(leaders), shared
+
+
+def prepare_deck_media(deck, audio=True):
+    """Queue image (and audio) generation for every card of a deck that lacks it (caller commits)
+
+    Cards with the same term (see media_key) get a single job whose result is
+    copied to all of them. Cards already covered by a pending or running job
+    are left alone, so calling this again only picks up what is still missing,
+    including failed images.
+    """
+    cards = Card.query.filter_by(deck_id=deck.id).order_by(Card.id).all()
+    active_images = _active_card_ids(deck.id, "image")
+    images = [card for card in cards if not card.image_url and card.id not in active_images]
+    queued_images, shared_images = _fan_out(images, "image", enqueue_image_job)
+
+    queued_audio = shared_audio = 0
+    if audio:
+        active_audio = _active_card_ids(deck.id, "audio")
+        missing = [card for card in cards if not card.audio_url and card.id not in active_audio]
+        queued_audio, shared_audio = _fan_out(missing, "audio", enqueue_audio_job)
+
+    return {
+        "queued_images": queued_images,
+        "queued_audio": queued_audio,
+        "shared": shared_images + shared_audio,
+    }
+
+
+def deck_media_progress(deck_id):
+    """How far a deck's media generation has got, for polling after prepare_deck_media"""
+    cards = (Card.query.filter_by(deck_id=deck_id)
+             .with_entities(Card.id, Card.image_url, Card.image_status, Card.audio_url)
+             .all())
+    active_images = _active_card_ids(deck_id, "image")
+    active_audio = _active_card_ids(deck_id, "audio")
+    images = {"ready": 0, "pending": 0, "failed": 0, "missing": 0}
+    audio = {"ready": 0, "pending": 0, "missing": 0}
+    for card_id, image_url, image_status, audio_url in cards:
+        # A 'pending' card whose job is gone counts as missing; prepare_deck_media requeues it
+        if card_id in active_images:
+            images["pending"] += 1
+        elif image_url:
+            images["ready"] += 1
+        elif image_status == "failed":
+            images["failed"] += 1
+        else:
+            images["missing"] += 1
+        if audio_url:
+            audio["ready"] += 1
+        elif card_id in active_audio:
+            audio["pending"] += 1
+        else:
+            audio["missing"] += 1
+    return {
+        "cards": len(cards),
+        "images": images,
+        "audio": audio,
+        "done": images["pending"] == 0 and audio["pending"] == 0,
+    }
+
+
+def _shared_cards(job):
+    """Cards that were attached to this job by prepare_deck_media"""
+    card_ids = json.loads(job.shared_with) if job.shared_with else []
+    return Card.query.filter(Card.id.in_(card_ids)).all() if card_ids else []
+
+
+@event.listens_for(Session, "before_flush")
+def _hand_over_shared_jobs(session, flush_context, instances):
+    """When a card whose job others share is deleted, give the job to the next of them
+
+    The job itself goes with the card (Card.image_jobs cascades), so a new one
+    is queued for the first surviving card and carries the rest of the list.
+    """
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Card)}
+    if not deleted:
+        return
+    with session.no_autoflush:
+        jobs = (session.query(ImageJob)
+                .filter(ImageJob.card_id.in_(deleted),
+                        ImageJob.shared_with.isnot(None),
+                        ImageJob.status.in_(["pending", "running"]))
+                .all())
+        for job in jobs:
+            card_ids = [card_id for card_id in json.loads(job.shared_with) if card_id not in deleted]
+            survivors = session.scalars(
+                select(Card.id).where(Card.id.in_(card_ids)).order_by(Card.id)
+            ).all() if card_ids else []
+            if survivors:
+                session.add(ImageJob(card_id=survivors[0], kind=job.kind,
+                                     shared_with=json.dumps(survivors[1:]) if survivors[1:] else None))
+
+
+def fake_image_generator(term, definition, delay=0.0):
+    """Stand-in for generate_image_for_term when running locally without Gemini"""
+    if delay:
+        time.sleep(delay)
+    term_hash = int(hashlib.md5(term.encode()).hexdigest()[:6], 16)
+    return f"https://picsum.photos/600/400?random={500 + (term_hash % 400)}"
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to 'running' and return it"""
+    while True:
+        job = (ImageJob.query
+               .filter_by(status="pending")
+               .filter(db.or_(ImageJob.run_after.is_(None), ImageJob.run_after <= datetime.utcnow()))
+               .order_by(ImageJob.id)
+               .first())
+        if not job:
+            return None
+
+        # Another worker may have grabbed the same row; only one UPDATE wins
+        claimed = ImageJob.query.filter_by(id=job.id, status="pending").update({
+            "status": "running",
+            "started_at": datetime.utcnow(),
+            "attempts": ImageJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+
+def run_job(job, generator, post_processor=None, audio_generator=None, fallback=None):
+    """Generate the image (or audio) for a claimed job and store it on the card
+
+    post_processor(image_url) may return extra renditions (see image_variants),
+    which are stored as JSON in Card.image_variants. audio_generator(text)
+    returns an audio URL for kind='audio' jobs. fallback(term, definition)
+    supplies the image once an image job has used up its attempts.
+    """
+    card = db.session.get(Card, job.card_id)
+    if not card:
+        job.status = "failed"
+        job.error = "Card no longer exists"
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return
+
+    is_audio = job.kind == "audio"
+    try:
+        if is_audio:
+            if audio_generator is None:
+                raise RuntimeError("No speech synthesizer configured")
+            result = audio_generator(card.term)
+        else:
+            result = generator(card.term, card.definition)
+        job.error = None
+    except Exception as e:
+        logger.error(f"{job.kind or 'image'} job {job.id} failed for card {card.id}: {e}")
+        job.error = str(e)
+        if job.attempts < MAX_ATTEMPTS:
+            job.status = "pending"
+            job.run_after = datetime.utcnow() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+            db.session.commit()
+            return
+        if is_audio or fallback is None:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            if not is_audio:
+                card.image_status = "failed"
+                for other in _shared_cards(job):
+                    if other.image_status == "pending":
+                        other.image_status = "failed"
+            db.session.commit()
+            return
+        result = fallback(card.term, card.definition)
+
+    if is_audio:
+        for target in [card] + [c for c in _shared_cards(job) if not c.audio_url]:
+            target.audio_url = result
+    else:
+        variants = post_processor(result) if post_processor else None
+        for target in [card] + [c for c in _shared_cards(job) if not c.image_url]:
+            target.image_url = result
+            target.image_variants = json.dumps(variants) if variants else None
+            target.image_status = "ready"
+    job.status = "done"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def requeue_stale_jobs(lease=None):
+    """Put jobs left 'running' by a crashed worker back in the queue
+
+    Only jobs started more than lease seconds ago are touched, so jobs that
+    workers in other processes are still running stay theirs.
+    """
+    lease = JOB_LEASE_SECONDS if lease is None else lease
+    cutoff = datetime.utcnow() - timedelta(seconds=lease)
+    count = ImageJob.query.filter(
+        ImageJob.status == "running",
+        db.or_(ImageJob.started_at.is_(None), ImageJob.started_at < cutoff),
+    ).update({"status": "pending"}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def pending_job_count():
+    """Number of jobs still waiting or in progress"""
+    return ImageJob.query.filter(ImageJob.status.in_(["pending", "running"])).count()
+
+
+class ImageJobWorkerPool:
+    """A small pool of threads that drain the image_jobs table
+
+    num_workers bounds how many Gemini/Watson calls run at once.
+    """
+
+    def __init__(self, app, generator, num_workers=2, poll_interval=1.0,
+                 post_processor=None, audio_generator=None, fallback=None):
+        self.app = app
+        self.generator = generator
+        self.fallback = fallback
+        self.post_processor = post_processor
+        self.audio_generator = audio_generator
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._in_flight = {}  # thread ident -> id of the job it is running
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        """Start the worker threads (no-op if already running)"""
+        if self.running:
+            return
+        self._stopping.clear()
+        with self.app.app_context():
+            requeued = requeue_stale_jobs()
+            if requeued:
+                logger.info(f"Requeued {requeued} stale image job(s)")
+        self._threads = [
+            threading.Thread(target=self._work, name=f"image-worker-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """Wake idle workers after new jobs were committed"""
+        self._wakeup.set()
+
+    def request_stop(self):
+        """Stop claiming new jobs; jobs already running carry on (safe from a signal handler)"""
+        self._stopping.set()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait up to timeout seconds for running ones to finish
+
+        Returns False if a worker was still busy when timeout ran out. The
+        caller is expected to exit then, so that worker's job is put straight
+        back in the queue rather than waiting out its lease; if the worker
+        does finish it after all, the job runs twice.
+        """
+        self.request_stop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        drained = not any(t.is_alive() for t in self._threads)
+        if not drained:
+            self._release(list(self._in_flight.values()))
+        self._threads = []
+        return drained
+
+    def _release(self, job_ids):
+        """Put unfinished jobs back in the queue"""
+        if not job_ids:
+            return
+        with self.app.app_context():
+            ImageJob.query.filter(ImageJob.id.in_(job_ids), ImageJob.status == "running").update(
+                {"status": "pending"}, synchronize_session=False
+            )
+            db.session.commit()
+        logger.info(f"Requeued {len(job_ids)} unfinished image job(s)")
+
+    def _work(self):
+        next_requeue = time.monotonic() + REQUEUE_INTERVAL
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    job = claim_next_job()
+                    if job:
+                        self._in_flight[threading.get_ident()] = job.id
+                        try:
+                            run_job(job, self.generator, self.post_processor, self.audio_generator,
+                                    self.fallback)
+                        finally:
+                            self._in_flight.pop(threading.get_ident(), None)
+                        continue
+                    # Idle: pick up jobs whose worker died since start()
+                    if time.monotonic() >= next_requeue:
+                        next_requeue = time.monotonic() + REQUEUE_INTERVAL
+                        if requeue_stale_jobs():
+                            continue
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Image worker error: {e}")
+                finally:
+                    db.session.remove()
+
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
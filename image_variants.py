@@ -0,0 +1,96 @@
+# image_variants.py
+"""Resized WebP/AVIF variants and a thumbnail for generated card images.
+
+Gemini returns ~1 MB PNGs; study and quiz pages only show them at ~200px tall,
+so each image is transcoded once after generation and served via srcset.
+Pillow is imported on first use, so only processes that transcode load it.
+"""
+import logging
+import os
+import threading
+
+VARIANT_WIDTHS = (320, 640, 960)
+THUMB_WIDTH = 32
+FORMATS = {
+    "avif": {"quality": 50, "speed": 8},
+    "webp": {"quality": 80, "method": 4},
+}
+STATIC_IMAGE_PREFIX = "/static/images/"
+IMAGE_DIR = os.path.join("static", "images")
+
+logger = logging.getLogger(__name__)
+
+
+def supported_formats():
+    """Output formats this Pillow build can encode, best compression first"""
+    from PIL import features
+    return [fmt for fmt in FORMATS if features.check(fmt)]
+
+
+def _resized(image, width):
+    from PIL import Image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _save(image, path, fmt):
+    if os.path.exists(path):
+        return
+    # Two workers may transcode the same deduplicated image at once; each writes its own temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        image.save(tmp_path, format=fmt.upper(), **FORMATS[fmt])
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def build_variants(source_path):
+    """Write variants next to source_path and return their filenames
+
+    Returns {"avif": [[width, filename], ...], "webp": [...], "thumb": filename}.
+    Widths larger than the original are skipped; existing files are reused.
+    """
+    from PIL import Image
+    directory, name = os.path.split(source_path)
+    stem = os.path.splitext(name)[0]
+    variants = {}
+
+    with Image.open(source_path) as original:
+        image = original.convert("RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB")
+        widths = [w for w in VARIANT_WIDTHS if w < image.width] or [image.width]
+
+        for fmt in supported_formats():
+            variants[fmt] = []
+            for width in widths:
+                filename = f"{stem}_w{width}.{fmt}"
+                _save(_resized(image, width), os.path.join(directory, filename), fmt)
+                variants[fmt].append([width, filename])
+
+        thumb_name = f"{stem}_thumb.webp"
+        _save(_resized(image, THUMB_WIDTH), os.path.join(directory, thumb_name), "webp")
+        variants["thumb"] = thumb_name
+
+    return variants
+
+
+def variants_for_url(image_url):
+    """Build variants for a locally stored image URL; None for remote placeholders"""
+    if not image_url or not image_url.startswith(STATIC_IMAGE_PREFIX):
+        return None
+
+    source_path = os.path.join(IMAGE_DIR, image_url[len(STATIC_IMAGE_PREFIX):])
+    try:
+        files = build_variants(source_path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not transcode {source_path}: {e}")
+        return None
+
+    def url(filename):
+        return STATIC_IMAGE_PREFIX + filename
+
+    result = {"thumb": url(files.pop("thumb"))}
+    for fmt, entries in files.items():
+        result[fmt] = [[width, url(filename)] for width, filename in entries]
+    return result
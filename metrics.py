@@ -0,0 +1,283 @@
+# metrics.py
+"""Request timing, SQL counters and an opt-in sampling profiler.
+
+init_app() installs:
+- before/after request hooks that time every request and record, per route
+  (endpoint name), the request count by status, a latency histogram, and the
+  number of SQL statements and total SQL time (from engine cursor events).
+  Each response carries a Server-Timing header with the same breakdown.
+- GET /metrics, which renders everything in the Prometheus text format,
+  together with the operation timers (timed()) and the outbound provider
+  stats. Set METRICS_TOKEN to require "Authorization: Bearer <token>";
+  without it only logged-in users can read it.
+
+Requests slower than SLOW_REQUEST_MS are logged. With PROFILE_SLOW_REQUESTS=1
+a background thread samples the stacks of threads that are serving requests
+every PROFILE_INTERVAL_MS; when a request turns out to be slow its samples
+are written to PROFILE_DIR as collapsed stacks ("frame;frame;frame count"),
+which flamegraph.pl, speedscope and inferno read directly.
+
+Counters live in the process; under gunicorn each worker reports its own.
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Response, abort, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import outbound
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+logger = logging.getLogger(__name__)
+
+
+class RouteStats:
+    """Totals for one endpoint"""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.latency = outbound.LatencyHistogram()
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_routes = defaultdict(RouteStats)
+_operations = defaultdict(outbound.LatencyHistogram)
+_lock = threading.Lock()
+
+
+def timed(operation):
+    """Decorator recording the wrapped function's duration under operation"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _operations[operation].observe((time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+
+# SQL: every engine's cursor events feed the current request's counters
+
+# The start time lives on the execution context, which is dropped with the
+# statement, so a statement that raises leaves nothing behind on the connection
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_request_context() and "request_started" in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+
+# Sampling profiler
+
+class StackSampler:
+    """Samples the Python stacks of registered threads from a background thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._samples = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+        self._ensure_running()
+
+    def end(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._samples:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+def collapse(frame):
+    """Root-first "file:function:line;..." string for a frame's stack"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def write_profile(stacks, endpoint, elapsed_ms, directory=PROFILE_DIR):
+    """Write collapsed stacks for one slow request; returns the file path"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed_ms)}ms-{os.getpid()}.folded"
+    path = os.path.join(directory, name.replace("/", "_"))
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_REQUESTS else None
+
+
+# Flask hooks
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    if sampler is not None:
+        sampler.begin(threading.get_ident())
+
+
+def _after_request(response):
+    if "request_started" not in g:
+        return response
+    elapsed_ms = (time.perf_counter() - g.request_started) * 1000
+    endpoint = request.endpoint or "unmatched"
+    stats = _routes[endpoint]
+    with _lock:
+        stats.statuses[response.status_code] += 1
+        stats.queries += g.sql_queries
+        stats.sql_seconds += g.sql_seconds
+    stats.latency.observe(elapsed_ms)
+
+    sql_ms = g.sql_seconds * 1000
+    response.headers.add("Server-Timing", f"db;dur={sql_ms:.1f};desc=\"{g.sql_queries} queries\"")
+    response.headers.add("Server-Timing", f"total;dur={elapsed_ms:.1f}")
+
+    stacks = sampler.end(threading.get_ident()) if sampler is not None else None
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        message = (f"Slow request {request.method} {request.path} ({endpoint}): {elapsed_ms:.0f} ms, "
+                   f"{g.sql_queries} queries, {sql_ms:.0f} ms SQL")
+        if stacks:
+            message += f"; profile in {write_profile(stacks, endpoint, elapsed_ms)}"
+        logger.warning(message)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request doesn't run when a view raises; don't leave the thread registered
+    if sampler is not None:
+        sampler.end(threading.get_ident())
+
+
+# Prometheus text format
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name, histogram, **labels):
+    """Cumulative *_bucket / *_sum / *_count lines with bounds in seconds"""
+    counts, total_ms = histogram.snapshot()
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(histogram.buckets) + ["+Inf"], counts):
+        cumulative += count
+        le = bound if bound == "+Inf" else bound / 1000
+        lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {total_ms / 1000:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {cumulative}")
+    return lines
+
+
+def render_metrics():
+    lines = [
+        "# HELP http_requests_total Requests handled, by endpoint and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    routes = sorted(_routes.items())
+    for endpoint, stats in routes:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f"http_requests_total{_labels(endpoint=endpoint, status=status)} {count}")
+
+    lines += ["# HELP http_request_duration_seconds Request latency.",
+              "# TYPE http_request_duration_seconds histogram"]
+    for endpoint, stats in routes:
+        lines += _histogram_lines("http_request_duration_seconds", stats.latency, endpoint=endpoint)
+
+    lines += ["# HELP sql_queries_total SQL statements executed while handling requests.",
+              "# TYPE sql_queries_total counter"]
+    lines += [f"sql_queries_total{_labels(endpoint=endpoint)} {stats.queries}" for endpoint, stats in routes]
+    lines += ["# HELP sql_duration_seconds_total Time spent in SQL while handling requests.",
+              "# TYPE sql_duration_seconds_total counter"]
+    lines += [f"sql_duration_seconds_total{_labels(endpoint=endpoint)} {stats.sql_seconds:.6f}"
+              for endpoint, stats in routes]
+
+    lines += ["# HELP operation_duration_seconds Duration of timed operations (image generation, speech).",
+              "# TYPE operation_duration_seconds histogram"]
+    for operation, histogram in sorted(_operations.items()):
+        lines += _histogram_lines("operation_duration_seconds", histogram, operation=operation)
+
+    lines += ["# HELP outbound_calls_total Calls to external providers, by outcome.",
+              "# TYPE outbound_calls_total counter"]
+    providers = sorted(outbound.PROVIDERS.items())
+    for name, provider in providers:
+        for outcome, count in sorted(provider.counters.items()):
+            lines.append(f"outbound_calls_total{_labels(provider=name, outcome=outcome)} {count}")
+    lines += ["# HELP outbound_circuit_open Whether the provider's circuit breaker is open.",
+              "# TYPE outbound_circuit_open gauge"]
+    for name, provider in providers:
+        lines.append(f"outbound_circuit_open{_labels(provider=name)} {int(not provider.available())}")
+    lines += ["# HELP outbound_attempt_duration_seconds Latency of individual provider attempts.",
+              "# TYPE outbound_attempt_duration_seconds histogram"]
+    for name, provider in providers:
+        lines += _histogram_lines("outbound_attempt_duration_seconds", provider.latency, provider=name)
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    token = os.getenv("METRICS_TOKEN")
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            abort(401)
+    elif not current_user.is_authenticated:
+        abort(401)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
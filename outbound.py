@@ -0,0 +1,268 @@
+# outbound.py
+"""Guarded calls to the external providers (Gemini images, Watson speech).
+
+Every call goes through a Provider, which
+- caps concurrent calls with a semaphore, so a slow upstream can tie up at
+  most max_concurrency threads. The limit is per process: under gunicorn
+  (up to 8 workers by default, see gunicorn.conf.py) plus any `flask
+  image-worker` processes, the upstream can see that many times more;
+  size OUTBOUND_<NAME>_MAX_CONCURRENCY for the whole deployment,
+- retries transient failures (timeouts, connection errors, 429 and 5xx) with
+  full-jitter exponential backoff, never sleeping past the call's deadline,
+- trips a circuit breaker after consecutive failures; while it's open calls
+  fail immediately with ProviderUnavailable so callers can use their fallback
+  (generate_image_for_term serves a picsum placeholder inline; image jobs
+  are retried later instead),
+- records per-attempt latency in a histogram.
+
+The provider SDKs are synchronous and the app is served by threaded WSGI
+workers, so this is a thread-safe blocking layer; per-request timeouts are
+set on the SDK clients themselves (app.py passes Provider.timeout to them).
+"""
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class ProviderUnavailable(RuntimeError):
+    """The call was not attempted: the breaker is open or no slot freed up before the deadline"""
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def snapshot(self):
+        """(bucket counts, total ms) read consistently"""
+        with self._lock:
+            return list(self.counts), self.total_ms
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def stats(self):
+        counts, _ = self.snapshot()
+        labels = [f"le_{bound}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, retries one call after reset_after seconds"""
+
+    def __init__(self, failure_threshold=5, reset_after=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may go through; in half-open state only one probe at a time"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self.trips += 1
+            self._probing = False
+
+
+def is_transient(exc):
+    """Whether a failed call is worth retrying"""
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(exc, "status_code", None)
+    if isinstance(code, int) and 100 <= code < 600:
+        return code == 429 or code >= 500
+    if isinstance(exc, OSError):  # socket timeouts, refused connections, urllib errors
+        return True
+    # httpx / requests / SDK-specific timeout and connection errors
+    name = type(exc).__name__.lower()
+    return "timeout" in name or "connect" in name
+
+
+class Provider:
+    """Concurrency limit, retries, circuit breaker and latency stats for one upstream"""
+
+    def __init__(self, name, max_concurrency=4, timeout=30.0, deadline=60.0, max_attempts=3,
+                 backoff_base=0.5, backoff_max=8.0, breaker=None, retryable=is_transient):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout  # per attempt; applied by the SDK client
+        self.deadline = deadline  # whole call, including retries and waiting for a slot
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.latency = LatencyHistogram()
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0,
+                         "rejected": 0, "busy": 0}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name, **defaults):
+        """Provider with settings overridable by OUTBOUND_<NAME>_<SETTING> environment variables"""
+        prefix = f"OUTBOUND_{name.upper()}_"
+        settings = {
+            "max_concurrency": int, "timeout": float, "deadline": float, "max_attempts": int,
+        }
+        for setting, cast in settings.items():
+            value = os.getenv(prefix + setting.upper())
+            if value is not None:
+                defaults[setting] = cast(value)
+        breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv(prefix + "BREAKER_FAILURES", "5")),
+            reset_after=float(os.getenv(prefix + "BREAKER_RESET", "30")),
+        )
+        return cls(name, breaker=breaker, **defaults)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform in [0, min(backoff_max, base * 2**attempt)]"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def available(self):
+        """False while the breaker is open (callers can skip straight to a fallback)"""
+        return self.breaker.state != "open"
+
+    def call(self, fn, *args, deadline=None, **kwargs):
+        """fn(*args, **kwargs) under this provider's limits
+
+        deadline is an absolute time.monotonic() value (default: now +
+        self.deadline). Raises ProviderUnavailable if the call could not be
+        attempted, otherwise the last error once retries are exhausted.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        self._count("calls")
+        attempt = 0
+        while True:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self._count("busy")
+                raise ProviderUnavailable(f"{self.name} has no free slot before the deadline")
+            # Checked after getting a slot, so callers queued behind a failing upstream bail out too
+            if not self.breaker.allow():
+                self._slots.release()
+                self._count("rejected")
+                raise ProviderUnavailable(f"{self.name} circuit is open")
+            with self._lock:
+                self._in_flight += 1
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self.latency.observe((time.perf_counter() - start) * 1000)
+                with self._lock:
+                    self._in_flight -= 1
+                self._slots.release()
+
+            if error is None:
+                self.breaker.record_success()
+                self._count("successes")
+                return result
+
+            # Only upstream trouble counts against the breaker; a 4xx means it answered
+            if self.retryable(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            attempt += 1
+            pause = self._backoff(attempt)
+            if (attempt >= self.max_attempts or not self.retryable(error)
+                    or time.monotonic() + pause >= deadline):
+                self._count("failures")
+                raise error
+            logger.warning(f"{self.name} call failed ({error}); retry {attempt} in {pause:.2f}s")
+            self._count("retries")
+            time.sleep(pause)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters, in_flight=self._in_flight)
+        return dict(counters,
+                    max_concurrency=self.max_concurrency,
+                    breaker={"state": self.breaker.state, "failures": self.breaker.failures,
+                             "trips": self.breaker.trips},
+                    latency=self.latency.stats())
+
+
+gemini = Provider.from_env("gemini", max_concurrency=4, timeout=60.0, deadline=120.0)
+watson = Provider.from_env("watson", max_concurrency=8, timeout=15.0, deadline=30.0)
+
+PROVIDERS = {provider.name: provider for provider in (gemini, watson)}
+
+
+def stats():
+    return {name: provider.stats() for name, provider in PROVIDERS.items()}
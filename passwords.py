@@ -0,0 +1,66 @@
+# passwords.py
+"""Password hashing policy.
+
+PASSWORD_HASH_METHOD picks the algorithm and cost for new hashes:
+- any werkzeug method string, e.g. "pbkdf2:sha256:600000" or "scrypt:16384:8:1"
+  (the default, "pbkdf2:sha256", is what set_password has always used, with
+  werkzeug's default iteration count);
+- "argon2" or "argon2:<time_cost>:<memory_kib>:<parallelism>", which needs
+  the argon2-cffi package.
+
+Existing hashes keep verifying whatever they were made with. After a
+successful login, needs_rehash() tells the caller whether the stored hash
+uses a different method or cost, so users move to the current policy as
+they sign in.
+"""
+import os
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
+ARGON2_PREFIX = "$argon2"
+
+
+@lru_cache(maxsize=None)
+def _argon2_hasher(method):
+    from argon2 import PasswordHasher  # only needed when the policy is argon2
+    params = [int(part) for part in method.split(":")[1:]]
+    names = ("time_cost", "memory_cost", "parallelism")
+    return PasswordHasher(**dict(zip(names, params)))
+
+
+@lru_cache(maxsize=None)
+def _werkzeug_prefix(method):
+    """The method string werkzeug writes into hashes, with defaults filled in (e.g. iterations)"""
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def hash_password(password, method=None):
+    method = method or HASH_METHOD
+    if method.startswith("argon2"):
+        return _argon2_hasher(method).hash(password)
+    return generate_password_hash(password, method=method)
+
+
+def verify(stored_hash, password):
+    if stored_hash.startswith(ARGON2_PREFIX):
+        from argon2.exceptions import InvalidHashError, VerificationError
+        try:
+            # Cost parameters are read from the hash itself
+            return _argon2_hasher("argon2").verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored_hash, password)
+
+
+def needs_rehash(stored_hash, method=None):
+    """Whether stored_hash was made with a different method or cost than the policy"""
+    method = method or HASH_METHOD
+    if method.startswith("argon2"):
+        return (not stored_hash.startswith(ARGON2_PREFIX)
+                or _argon2_hasher(method).check_needs_rehash(stored_hash))
+    if stored_hash.startswith(ARGON2_PREFIX):
+        return True
+    return stored_hash.split("$", 1)[0] != _werkzeug_prefix(method)
@@ -0,0 +1,80 @@
+# providers.py
+"""Lazily constructed clients for the optional provider SDKs.
+
+google.genai and ibm_watson take a good part of a second to import, and
+most processes (web workers serving pages, `flask image-worker` processes
+with a fake generator) never call them. Each provider is registered with a
+cheap configured() check, which only reads the environment, and a factory
+that imports the SDK and builds the client. The factory runs on the first
+get(), once per process.
+"""
+import logging
+import os
+import threading
+
+import outbound
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRegistry:
+    """name -> (configured() check, factory()); clients are built on first get()"""
+
+    def __init__(self):
+        self._providers = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, configured, factory):
+        self._providers[name] = (configured, factory)
+
+    def configured(self, name):
+        """Whether the provider has the credentials it needs (no SDK import)"""
+        return bool(self._providers[name][0]())
+
+    def get(self, name):
+        """The provider's client, or None if it isn't configured"""
+        if name in self._clients:
+            return self._clients[name]
+        with self._lock:
+            if name not in self._clients:
+                configured, factory = self._providers[name]
+                self._clients[name] = factory() if configured() else None
+                if self._clients[name] is not None:
+                    logger.info(f"Loaded provider client {name}")
+            return self._clients[name]
+
+    def loaded(self):
+        return sorted(self._clients)
+
+
+def _gemini_configured():
+    return os.getenv("GENAI_KEY")
+
+
+def _gemini_client():
+    from google import genai
+    from google.genai import types
+    # Per-request timeout; retries and concurrency limits come from outbound.gemini
+    return genai.Client(
+        api_key=os.getenv("GENAI_KEY"),
+        http_options=types.HttpOptions(timeout=int(outbound.gemini.timeout * 1000)),
+    )
+
+
+def _watson_configured():
+    return os.getenv("IBM_TTS_API_KEY") and os.getenv("IBM_TTS_URL")
+
+
+def _watson_client():
+    from ibm_watson import TextToSpeechV1
+    from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
+    tts = TextToSpeechV1(authenticator=IAMAuthenticator(os.getenv("IBM_TTS_API_KEY")))
+    tts.set_service_url(os.getenv("IBM_TTS_URL"))
+    tts.set_http_config({"timeout": outbound.watson.timeout})
+    return tts
+
+
+registry = ProviderRegistry()
+registry.register("gemini", _gemini_configured, _gemini_client)
+registry.register("watson", _watson_configured, _watson_client)
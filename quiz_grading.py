@@ -0,0 +1,104 @@
+# quiz_grading.py
+"""Typed-answer grading for quizzes.
+
+Answers and expected terms are normalized (accents stripped, case folded,
+punctuation and extra whitespace removed, a leading article dropped) and then
+compared with a Levenshtein distance that only fills a diagonal band of
+width 2 * max_distance + 1 and stops as soon as every cell in a row exceeds
+the cutoff. Most wrong answers are rejected after a few rows, so a
+500-answer submission grades in a few milliseconds.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+WHITESPACE = re.compile(r"\s+")
+ARTICLES = ("the ", "a ", "an ")
+
+
+@lru_cache(maxsize=4096)
+def normalize(text):
+    """Fold an answer or term to the form it's compared in"""
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold()
+    text = WHITESPACE.sub(" ", PUNCTUATION.sub(" ", text)).strip()
+    for article in ARTICLES:
+        if text.startswith(article) and len(text) > len(article):
+            return text[len(article):]
+    return text
+
+
+def allowed_typos(length):
+    """Edits tolerated for an expected answer of this (normalized) length"""
+    if length <= 3:
+        return 0
+    if length <= 7:
+        return 1
+    return 2
+
+
+def bounded_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or None if it exceeds max_distance"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    # A shared prefix and suffix never add edits; typos leave only a few characters
+    start = 0
+    shortest = min(len(a), len(b))
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b)
+
+    too_far = max_distance + 1
+    len_b = len(b)
+    previous = list(range(len_b + 1))
+    for i, char_a in enumerate(a, start=1):
+        # Only cells within max_distance of the diagonal can stay under the cutoff
+        low = i - max_distance if i > max_distance else 1
+        high = i + max_distance if i + max_distance < len_b else len_b
+        current = [too_far] * (len_b + 1)
+        row_min = current[0] = i if i <= max_distance else too_far
+        for j in range(low, high + 1):
+            value = previous[j - 1] if char_a == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous = current
+
+    distance = previous[len_b]
+    return distance if distance <= max_distance else None
+
+
+def grade(answer, expected):
+    """(correct, distance) for one answer; distance is None when it's not close"""
+    given = normalize(answer)
+    target = normalize(expected)
+    if not given:
+        return False, None
+    distance = bounded_distance(given, target, allowed_typos(len(target)))
+    return distance is not None, distance
+
+
+def grade_batch(pairs):
+    """grade() for a list of (answer, expected) pairs"""
+    return [grade(answer, expected) for answer, expected in pairs]
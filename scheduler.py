@@ -0,0 +1,117 @@
+# scheduler.py
+"""SM-2 spaced-repetition scheduling on top of StudyProgress.
+
+Each (user, card) progress row carries ease, interval, repetitions and a due
+date. The review queue is read with a single range scan over the
+(user_id, due_at) index.
+"""
+from datetime import datetime, timedelta
+
+from deck_database import db, Card, StudyProgress
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+
+# Button labels accepted in place of raw 0-5 SM-2 grades
+GRADE_NAMES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+
+def parse_grade(value):
+    """Turn an SM-2 grade (0-5) or a button name into an int, or None if invalid"""
+    if isinstance(value, str):
+        if value.lower() in GRADE_NAMES:
+            return GRADE_NAMES[value.lower()]
+        if not value.isdigit():
+            return None
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 5:
+        return None
+    return value
+
+
+def apply_review(progress, grade, now=None):
+    """Update a progress row's schedule for a review graded 0-5 (SM-2)"""
+    now = now or datetime.utcnow()
+    ease = progress.ease or DEFAULT_EASE
+    interval = progress.interval_days or 0
+    repetitions = progress.repetitions or 0
+
+    if grade < 3:
+        # Lapse: start the card over but keep (a reduced) ease
+        repetitions = 0
+        interval = 1
+        progress.lapses = (progress.lapses or 0) + 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease, 2)
+        repetitions += 1
+
+    ease += 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)
+    progress.ease = max(MIN_EASE, round(ease, 3))
+    progress.interval_days = interval
+    progress.repetitions = repetitions
+    progress.last_reviewed_at = now
+    progress.studied_at = now
+    progress.due_at = now + timedelta(days=interval)
+    return progress
+
+
+def review_card(user_id, card, grade, now=None):
+    """Record a graded review, creating the progress row on first review (caller commits)"""
+    progress = StudyProgress.query.filter_by(user_id=user_id, card_id=card.id).first()
+    if not progress:
+        progress = StudyProgress(user_id=user_id, card_id=card.id, deck_id=card.deck_id,
+                                 ease=DEFAULT_EASE, interval_days=0, repetitions=0, lapses=0)
+        db.session.add(progress)
+    return apply_review(progress, grade, now)
+
+
+def due_cards(user_id, limit=20, now=None):
+    """The next `limit` due cards across all of a user's decks, most overdue first"""
+    now = now or datetime.utcnow()
+    rows = (
+        db.session.query(
+            StudyProgress.card_id,
+            StudyProgress.deck_id,
+            StudyProgress.due_at,
+            StudyProgress.interval_days,
+            StudyProgress.ease,
+            Card.term,
+            Card.definition,
+            Card.image_url,
+            Card.audio_url,
+        )
+        .join(Card, Card.id == StudyProgress.card_id)
+        .filter(StudyProgress.user_id == user_id, StudyProgress.due_at <= now)
+        .order_by(StudyProgress.due_at)
+        .limit(limit)
+        .all()
+    )
+    return [{
+        "card_id": row.card_id,
+        "deck_id": row.deck_id,
+        "term": row.term,
+        "definition": row.definition,
+        "image_url": row.image_url,
+        "audio_url": row.audio_url,
+        "due_at": row.due_at.isoformat(),
+        "interval_days": row.interval_days,
+        "ease": row.ease,
+    } for row in rows]
+
+
+def backfill_schedule():
+    """Make progress rows recorded before scheduling existed due for review"""
+    updated = StudyProgress.query.filter(StudyProgress.due_at.is_(None)).update({
+        "due_at": db.func.coalesce(StudyProgress.studied_at, db.func.current_timestamp()),
+        "ease": DEFAULT_EASE,
+        "interval_days": 0,
+        "repetitions": 0,
+        "lapses": 0,
+    }, synchronize_session=False)
+    db.session.commit()
+    return updated
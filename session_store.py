@@ -0,0 +1,230 @@
+# session_store.py
+"""Short-lived game state for visual matching sessions.
+
+A session lives in a key/value backend for the duration of the game: pairs
+are held in a dict keyed by pair id, so each match check is a dict lookup
+with no database I/O. Only a compact summary is written to visual_sessions
+when the session ends. Sessions that are abandoned expire after a TTL.
+
+MemoryBackend keeps live objects in this process. RedisBackend stores JSON
+in anything that speaks the redis-py get/set(ex=)/delete API, so several
+app processes can share sessions; FakeRedis stands in for a Redis server
+when running locally.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+
+DEFAULT_TTL = int(os.getenv("VISUAL_SESSION_TTL", "3600"))
+
+
+class VisualSession:
+    """Pairs and score for one matching game"""
+
+    def __init__(self, user_id, deck_id, pairs, session_id=None, matched=(),
+                 cards_viewed=0, correct_matches=0, started_at=None):
+        self.id = session_id or secrets.token_urlsafe(16)
+        self.user_id = user_id
+        self.deck_id = deck_id
+        # pair id -> pair, in the shuffled order the client was given
+        self.pairs = {pair["id"]: pair for pair in pairs}
+        self.card_count = len({pair["term_id"] for pair in pairs})
+        self.matched = set(matched)
+        self.cards_viewed = cards_viewed
+        self.correct_matches = correct_matches
+        self.started_at = started_at or time.time()
+
+    @property
+    def all_matched(self):
+        return len(self.matched) >= self.card_count
+
+    def check(self, id1, id2):
+        """Score one guess; returns None if either pair id is unknown"""
+        card1 = self.pairs.get(id1)
+        card2 = self.pairs.get(id2)
+        if not card1 or not card2:
+            return None
+
+        self.cards_viewed += 1
+        is_match = card1["term_id"] == card2["term_id"] and card1["type"] != card2["type"]
+        if is_match and card1["term_id"] not in self.matched:
+            self.matched.add(card1["term_id"])
+            self.correct_matches += 1
+        return is_match
+
+    def pair_list(self):
+        """Pairs with their matched flag, for the client"""
+        return [dict(pair, matched=pair["term_id"] in self.matched) for pair in self.pairs.values()]
+
+    def summary(self):
+        """What gets persisted when the session ends"""
+        return {
+            "cards": self.card_count,
+            "matched": sorted(self.matched),
+        }
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "deck_id": self.deck_id,
+            "pairs": list(self.pairs.values()),
+            "matched": sorted(self.matched),
+            "cards_viewed": self.cards_viewed,
+            "correct_matches": self.correct_matches,
+            "started_at": self.started_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["user_id"], data["deck_id"], data["pairs"],
+                   session_id=data["id"],
+                   matched=data["matched"],
+                   cards_viewed=data["cards_viewed"],
+                   correct_matches=data["correct_matches"],
+                   started_at=data["started_at"])
+
+
+class MemoryBackend:
+    """In-process store with per-key expiry; values are kept as live objects"""
+
+    def __init__(self, sweep_interval=60.0):
+        self._items = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= now:
+                del self._items[key]
+                return None
+            return item[1]
+
+    def set(self, key, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._items[key] = (now + ttl, value)
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def _sweep(self, now):
+        """Drop expired entries so abandoned sessions don't accumulate"""
+        expired = [key for key, (expires_at, _) in self._items.items() if expires_at <= now]
+        for key in expired:
+            del self._items[key]
+        self._next_sweep = now + self._sweep_interval
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisBackend:
+    """Store sessions as JSON in a redis-py compatible client"""
+
+    def __init__(self, client, prefix="visual_session:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return VisualSession.from_dict(json.loads(raw))
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value.to_dict()), ex=int(ttl))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class FakeRedis:
+    """The slice of the redis-py client our Redis backends use, kept in memory"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            item = self._data.get(name)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[name] = (value, expires_at)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value, expires_at = self._data.get(name, (b"0", None))
+            value = int(value) + amount
+            self._data[name] = (str(value).encode("utf-8"), expires_at)
+            return value
+
+
+class SessionStore:
+    """Create, load, save and close VisualSessions on a backend"""
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+
+    def create(self, user_id, deck_id, pairs):
+        visual_session = VisualSession(user_id, deck_id, pairs)
+        self.backend.set(visual_session.id, visual_session, self.ttl)
+        return visual_session
+
+    def get(self, session_id, user_id):
+        """The user's live session, or None if unknown, expired or someone else's"""
+        if not isinstance(session_id, str):
+            return None
+        visual_session = self.backend.get(session_id)
+        if visual_session is None or visual_session.user_id != user_id:
+            return None
+        return visual_session
+
+    def save(self, visual_session):
+        """Write back changes and extend the session's TTL"""
+        self.backend.set(visual_session.id, visual_session, self.ttl)
+
+    def pop(self, session_id, user_id):
+        visual_session = self.get(session_id, user_id)
+        if visual_session is not None:
+            self.backend.delete(session_id)
+        return visual_session
+
+
+def backend_from_env():
+    """Backend named by VISUAL_SESSION_BACKEND: memory (default), redis or fakeredis"""
+    name = os.getenv("VISUAL_SESSION_BACKEND", "memory").lower()
+    if name == "redis":
+        import redis  # only needed when sessions are shared through a Redis server
+        return RedisBackend(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    if name == "fakeredis":
+        return RedisBackend(FakeRedis())
+    return MemoryBackend()
@@ -11,4 +11,106 @@ let totalCards = 1;
 
 function updateProgress() {
     console.log('Progress update for now');
-    }
\ No newline at end of file
+    }
+// Build a <picture> for a card image, preferring AVIF/WebP variants when present
+function buildCardImage(card, alt) {
+    const picture = document.createElement('picture');
+    picture.className = 'flashcard-picture';
+    const variants = card.image_variants || {};
+
+    ['avif', 'webp'].forEach(fmt => {
+        if (!variants[fmt]) return;
+        const source = document.createElement('source');
+        source.type = `image/${fmt}`;
+        source.sizes = '320px';
+        source.srcset = variants[fmt].map(([width, url]) => `${url} ${width}w`).join(', ');
+        picture.appendChild(source);
+    });
+
+    const img = document.createElement('img');
+    img.src = card.image_url;
+    img.alt = alt;
+    img.className = 'flashcard-image';
+    if (variants.thumb) {
+        img.style.backgroundImage = `url('${variants.thumb}')`;
+    }
+    picture.appendChild(img);
+    return picture;
+}
+
+// Fetch the next window of a deck's cards (keyset-paginated by card id)
+async function fetchCardWindow(deckId, after, limit) {
+    const response = await fetch(`/api/decks/${deckId}/cards?after=${after}&limit=${limit}`);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    return response.json();
+}
+
+// Grade typed quiz answers on the server: answers is [{card_id, answer}, ...]
+async function gradeQuizAnswers(deckId, answers) {
+    const response = await fetch(`/api/quiz/${deckId}/answers`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ answers: answers })
+    });
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    return response.json();
+}
+
+// Buffer study progress and send it in batches instead of one request per card flip.
+// Flushes every 10 seconds, and via sendBeacon when the page is hidden or closed.
+const studyEvents = {
+    buffer: [],
+    url: '/api/study/events',
+    maxBatch: 1000,
+
+    record(cardId, event) {
+        this.buffer.push({ card_id: cardId, event: event, timestamp: Date.now() });
+        if (this.buffer.length >= this.maxBatch) {
+            this.flush();
+        }
+    },
+
+    take() {
+        return this.buffer.splice(0, this.maxBatch);
+    },
+
+    async flush() {
+        if (this.buffer.length === 0) return;
+        const events = this.take();
+        try {
+            const response = await fetch(this.url, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ events: events })
+            });
+            if (!response.ok && response.status >= 500) {
+                this.buffer.unshift(...events);
+            }
+        } catch (error) {
+            // Keep the events for the next flush
+            this.buffer.unshift(...events);
+            console.error('Failed to send study progress:', error);
+        }
+    },
+
+    beacon() {
+        while (this.buffer.length > 0) {
+            const blob = new Blob([JSON.stringify({ events: this.take() })], { type: 'application/json' });
+            if (!navigator.sendBeacon || !navigator.sendBeacon(this.url, blob)) {
+                break;
+            }
+        }
+    }
+};
+
+setInterval(() => studyEvents.flush(), 10000);
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+        studyEvents.beacon();
+    }
+});
+window.addEventListener('pagehide', () => studyEvents.beacon());
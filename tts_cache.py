@@ -0,0 +1,170 @@
+# tts_cache.py
+"""On-disk cache for synthesized speech.
+
+Audio is keyed by (text, voice) and kept as <key>.mp3 files. When the cache
+grows past max_bytes the least recently played files are evicted.
+
+Several processes (gunicorn workers, TTS_api.py) may share the directory,
+so the disk is the source of truth: a key missing from this process's index
+is looked up on disk, and the directory is rescanned before evicting (and at
+least every RESCAN_INTERVAL seconds on writes), so max_bytes bounds the
+directory rather than each process's share of it.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RESCAN_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def watson_synthesizer(get_client, provider=None):
+    """Adapt IBM Watson TextToSpeechV1 to the synthesizer(text, voice) signature
+
+    get_client() returns the TextToSpeechV1 client, so the SDK is only loaded
+    once something is synthesized. provider (an outbound.Provider) adds
+    concurrency limits, retries and a circuit breaker around each request.
+    """
+    def request(text, voice):
+        return get_client().synthesize(text, voice=voice, accept="audio/mp3").get_result().content
+
+    def synthesize(text, voice):
+        if provider is None:
+            return request(text, voice)
+        return provider.call(request, text, voice)
+    return synthesize
+
+
+def fake_synthesizer(text, voice):
+    """Stand-in for Watson when running locally; returns deterministic bytes, not real audio"""
+    return b"ID3" + hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).digest()
+
+
+class TTSCache:
+    """Size-bounded LRU cache of MP3 files"""
+
+    def __init__(self, directory, max_bytes, synthesizer=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.synthesizer = synthesizer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._size = 0
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._rescan()
+
+    @staticmethod
+    def key(text, voice):
+        return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _rescan(self):
+        """Rebuild the index from the files on disk, oldest access first, then evict
+
+        The directory is listed outside the lock so plays aren't held up by it.
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext != ".mp3" or not KEY_PATTERN.match(key):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:  # evicted by another process meanwhile
+                continue
+            files.append((stat.st_mtime, key, stat.st_size))
+        files.sort()
+        with self._lock:
+            self._entries = OrderedDict((key, size) for _, key, size in files)
+            self._size = sum(self._entries.values())
+            self._last_scan = time.monotonic()
+            self._evict()
+
+    def get(self, key):
+        """Path of a cached file (marking it recently used), or None"""
+        path = self.path(key)
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        if not known:
+            # Possibly written by another process since we last looked
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                return None
+            with self._lock:
+                self._size += size - self._entries.pop(key, 0)
+                self._entries[key] = size
+        try:
+            # mtime doubles as the access time so LRU order survives restarts
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key, audio_bytes):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(audio_bytes)
+            self._size += len(audio_bytes)
+            rescan = (self._size > self.max_bytes
+                      or time.monotonic() - self._last_scan >= RESCAN_INTERVAL)
+        if rescan:
+            # Other processes write here too; size the directory before evicting anything
+            self._rescan()
+        return path
+
+    def get_or_synthesize(self, text, voice):
+        """Return the cache key for (text, voice), synthesizing on a miss"""
+        key = self.key(text, voice)
+        if self.get(key):
+            self.hits += 1
+            return key
+
+        if self.synthesizer is None:
+            raise RuntimeError("TTS service not available")
+        self.misses += 1
+        self.put(key, self.synthesizer(text, voice))
+        return key
+
+    def _evict(self):
+        # Caller holds the lock; always keep the newest entry
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,120 @@
+# user_cache.py
+"""Short-lived per-process cache behind Flask-Login's user_loader.
+
+Every authenticated request used to start with a SELECT on users. Instead
+the user's column values are kept for USER_CACHE_TTL seconds and turned back
+into a session-attached User with Session.merge(load=False), which costs no
+query; relationships such as user.decks still load through the session.
+
+Updates and deletes of a User through the ORM drop its entry once the
+transaction commits, so a password, name or is_active change is seen by the
+next request in this process. Other processes see it within the TTL.
+USER_CACHE_TTL=0 turns the cache off.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from deck_database import db, User
+
+TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+PENDING_KEY = "user_cache_pending"
+
+
+class UserCache:
+    """user id -> (expires_at, column values), with hit/miss counters"""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id, values):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest half if that wasn't enough
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    keep = sorted(self._entries.items(), key=lambda item: item[1][0])[self.max_entries // 2:]
+                    self._entries = dict(keep)
+            self._entries[user_id] = (now + self.ttl, values)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+cache = UserCache()
+
+COLUMNS = [attr.key for attr in User.__mapper__.column_attrs]
+
+
+def load_user(user_id):
+    """The User for a session's user id, from the cache when possible"""
+    values = cache.get(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        cache.put(user_id, {key: getattr(user, key) for key in COLUMNS})
+    return user
+
+
+# Invalidation: note changed users during the flush, drop them after commit
+
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_KEY, set()).add(target.id)
+
+
+event.listen(User, "after_update", _user_changed)
+event.listen(User, "after_delete", _user_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    user_ids = session.info.pop(PENDING_KEY, None)
+    if user_ids:
+        cache.invalidate(*user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,204 @@
+# user_stats.py
+"""Incrementally maintained dashboard totals (the user_stats table).
+
+Deck, card and studied-card counts are adjusted by an after_flush listener
+whenever Deck, Card or StudyProgress rows are added or deleted through the
+ORM. Writes that bypass the ORM (StudyProgress.upsert_studied) call adjust()
+themselves, and study/quiz activity goes through record_activity(). A user's
+row is computed from scratch the first time it's needed, so the dashboard is
+always a single primary-key read.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from deck_database import db, Card, Deck, QuizAttempt, StudyProgress, UserStats
+
+COUNTERS = ("deck_count", "card_count", "studied_count", "quiz_correct", "quiz_attempts")
+
+table = UserStats.__table__
+
+
+def _insert(connection):
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def compute(connection, user_id):
+    """Totals for a user counted from the underlying tables"""
+    deck_count = connection.execute(
+        select(func.count(Deck.id)).where(Deck.owner_id == user_id)
+    ).scalar()
+    card_count = connection.execute(
+        select(func.count(Card.id)).join(Deck, Deck.id == Card.deck_id).where(Deck.owner_id == user_id)
+    ).scalar()
+    studied_count, last_studied = connection.execute(
+        select(func.count(StudyProgress.id), func.max(StudyProgress.studied_at))
+        .join(Card, Card.id == StudyProgress.card_id)
+        .where(StudyProgress.user_id == user_id)
+    ).one()
+    quiz_attempts, quiz_correct = connection.execute(
+        select(func.count(QuizAttempt.id),
+               func.coalesce(func.sum(case((QuizAttempt.correct, 1), else_=0)), 0))
+        .where(QuizAttempt.user_id == user_id)
+    ).one()
+    if isinstance(last_studied, str):  # SQLite returns max() of a DateTime as text
+        last_studied = datetime.fromisoformat(last_studied)
+    return {
+        "user_id": user_id,
+        "deck_count": deck_count,
+        "card_count": card_count,
+        "studied_count": studied_count,
+        "quiz_correct": quiz_correct,
+        "quiz_attempts": quiz_attempts,
+        "current_streak": 1 if last_studied else 0,
+        "longest_streak": 1 if last_studied else 0,
+        "last_study_date": last_studied.date() if last_studied else None,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def ensure(connection, user_id):
+    """Create the user's row from current data if it doesn't exist yet
+
+    Returns True if a row was created, in which case it already reflects
+    everything written so far in this transaction.
+    """
+    exists = connection.execute(
+        select(table.c.user_id).where(table.c.user_id == user_id)
+    ).first()
+    if exists:
+        return False
+    connection.execute(_insert(connection).values(compute(connection, user_id))
+                       .on_conflict_do_nothing(index_elements=["user_id"]))
+    return True
+
+
+def adjust(connection, user_id, **deltas):
+    """Add deltas (e.g. card_count=-3) to a user's counters in one UPDATE
+
+    Call after the change has been executed in the same transaction.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas or user_id is None:
+        return
+    unknown = set(deltas) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown counters: {', '.join(sorted(unknown))}")
+    if ensure(connection, user_id):
+        return
+    values = {name: table.c[name] + delta for name, delta in deltas.items()}
+    connection.execute(
+        table.update().where(table.c.user_id == user_id).values(updated_at=datetime.utcnow(), **values)
+    )
+
+
+def record_activity(connection, user_id, when=None, correct=0, attempts=0):
+    """Count quiz answers and extend the user's daily study streak"""
+    day = (when or datetime.utcnow()).date()
+    ensure(connection, user_id)
+    last = table.c.last_study_date
+    streak = case(
+        (last == day, table.c.current_streak),
+        (last == day - timedelta(days=1), table.c.current_streak + 1),
+        else_=1,
+    )
+    connection.execute(
+        table.update()
+        .where(table.c.user_id == user_id)
+        .values(
+            quiz_correct=table.c.quiz_correct + correct,
+            quiz_attempts=table.c.quiz_attempts + attempts,
+            updated_at=datetime.utcnow(),
+        )
+    )
+    # Late events for an earlier day count towards accuracy but not the streak
+    connection.execute(
+        table.update()
+        .where(table.c.user_id == user_id)
+        .where((last.is_(None)) | (last < day))
+        .values(
+            current_streak=streak,
+            longest_streak=case((streak > table.c.longest_streak, streak), else_=table.c.longest_streak),
+            last_study_date=day,
+        )
+    )
+
+
+def dashboard(user_id):
+    """Dashboard totals for a user: one primary-key read once the row exists"""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        ensure(db.session.connection(), user_id)
+        db.session.commit()
+        stats = db.session.get(UserStats, user_id)
+
+    today = datetime.utcnow().date()
+    # A streak survives until the end of the day after the last study day
+    current_streak = stats.current_streak
+    if not stats.last_study_date or stats.last_study_date < today - timedelta(days=1):
+        current_streak = 0
+    accuracy = stats.quiz_correct / stats.quiz_attempts * 100 if stats.quiz_attempts else 0
+    return {
+        "total_decks": stats.deck_count,
+        "total_cards": stats.card_count,
+        "studied_cards": stats.studied_count,
+        "quiz_attempts": stats.quiz_attempts,
+        "quiz_correct": stats.quiz_correct,
+        "accuracy_rate": round(accuracy, 1),
+        "current_streak": current_streak,
+        "longest_streak": stats.longest_streak,
+        "last_study_date": stats.last_study_date.isoformat() if stats.last_study_date else None,
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    """Turn ORM inserts/deletes of decks, cards and progress rows into counter deltas"""
+    changes = [(obj, 1) for obj in session.new] + [(obj, -1) for obj in session.deleted]
+    if not any(isinstance(obj, (Deck, Card, StudyProgress)) for obj, _ in changes):
+        return
+
+    deltas = {name: Counter() for name in ("deck_count", "card_count", "studied_count")}
+    owners = {}  # deck_id -> owner_id for decks we already have in hand
+    for obj in list(session.identity_map.values()) + [obj for obj, _ in changes]:
+        if isinstance(obj, Deck):
+            owners[obj.id] = obj.owner_id
+
+    cards = []
+    deleted_card_ids = []
+    for obj, sign in changes:
+        if isinstance(obj, Deck):
+            deltas["deck_count"][obj.owner_id] += sign
+        elif isinstance(obj, Card):
+            cards.append((obj.deck_id, sign))
+            if sign < 0:
+                deleted_card_ids.append(obj.id)
+        elif isinstance(obj, StudyProgress):
+            deltas["studied_count"][obj.user_id] += sign
+
+    connection = session.connection()
+    missing = {deck_id for deck_id, _ in cards if deck_id not in owners}
+    if missing:
+        owners.update(connection.execute(
+            select(Deck.id, Deck.owner_id).where(Deck.id.in_(missing))
+        ).all())
+    for deck_id, sign in cards:
+        deltas["card_count"][owners.get(deck_id)] += sign
+
+    if deleted_card_ids:
+        # Progress rows of deleted cards are left behind but no longer count as studied
+        for user_id, count in connection.execute(
+            select(StudyProgress.user_id, func.count(StudyProgress.id))
+            .where(StudyProgress.card_id.in_(deleted_card_ids))
+            .group_by(StudyProgress.user_id)
+        ):
+            deltas["studied_count"][user_id] -= count
+
+    for user_id in set().union(*deltas.values()):
+        adjust(connection, user_id, **{name: counts[user_id] for name, counts in deltas.items()})
@@ -1,14 +1,25 @@
 from flask import Flask, request, jsonify, session
-import sqlite3
 import json
 import random
+from datetime import datetime, timezone
+from card_sampler import sample_cards
+from db_config import connect_sqlite, sqlite_path
+from session_store import SessionStore, backend_from_env
 
 app = Flask(__name__)
 app.secret_key = 'SECRET_KEY'
-DB_PATH = 'deck.db'
+# In-progress matching games; see session_store.py
+session_store = SessionStore(backend_from_env())
+
+def db_path():
+    """Same database file (and WAL/busy-timeout settings) as the main app
+
+    Resolved on use, so the module still imports with a non-SQLite DATABASE_URL.
+    """
+    return sqlite_path(app)
 
 def init_visual_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_sqlite(db_path())
     c = conn.cursor()
     # Session + preferences tables
     c.execute('''
@@ -28,18 +39,22 @@ def init_visual_db():
     conn.commit()
     conn.close()
 
-def get_visual_cards(user_id, deck_id, limit=20):
-    conn = sqlite3.connect(DB_PATH)
+def get_visual_cards(user_id, deck_id, limit=20, weighted=False):
+    conn = connect_sqlite(db_path())
     c = conn.cursor()
-    c.execute('''
+    # Indexed sampling instead of ORDER BY RANDOM(); see card_sampler.py
+    card_ids = sample_cards(conn, user_id, deck_id, limit, weighted=weighted)
+    if not card_ids:
+        conn.close()
+        return []
+    c.execute(f'''
         SELECT c.id, c.term, c.image_url
         FROM cards c
-        WHERE c.deck_id = ?
-        ORDER BY RANDOM()
-        LIMIT ?
-    ''', (deck_id, limit))
+        WHERE c.id IN ({','.join('?' * len(card_ids))})
+    ''', card_ids)
     cards = [{'id': r[0], 'term': r[1], 'image_url': r[2]} for r in c.fetchall()]
     conn.close()
+    random.shuffle(cards)
     return cards
 
 def create_matching_pairs(cards):
@@ -56,26 +71,16 @@ def start_visual_session(deck_id):
     if 'user_id' not in session:
         return jsonify({'error':'Not logged in'}), 401
 
-    init_visual_db()
     user_id = session['user_id']
-    cards = get_visual_cards(user_id, deck_id, limit=request.json.get('limit', 10))
+    cards = get_visual_cards(user_id, deck_id, limit=request.json.get('limit', 10),
+                             weighted=bool(request.json.get('weighted')))
     if not cards:
         return jsonify({'error':'No cards found'}), 404
 
     pairs = create_matching_pairs(cards)
-    session_data = {'pairs': pairs}
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO visual_sessions (user_id, deck_id, session_data)
-        VALUES (?, ?, ?)
-    ''', (user_id, deck_id, json.dumps(session_data)))
-    session_id = c.lastrowid
-    conn.commit()
-    conn.close()
-
-    return jsonify({'session_id': session_id, 'pairs': pairs})
+    # Game state stays in the session store until the session ends
+    visual_session = session_store.create(user_id, deck_id, pairs)
+    return jsonify({'session_id': visual_session.id, 'pairs': pairs})
 
 @app.route('/visual/check', methods=['POST'])
 def check_match():
@@ -83,61 +88,61 @@ def check_match():
         return jsonify({'error':'Not logged in'}), 401
 
     data = request.json
-    session_id = data.get('session_id')
-    id1 = data.get('id1')
-    id2 = data.get('id2')
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT session_data, correct_matches FROM visual_sessions WHERE id = ? AND user_id = ?',
-              (session_id, session['user_id']))
-    row = c.fetchone()
-    if not row:
-        conn.close()
+    visual_session = session_store.get(data.get('session_id'), session['user_id'])
+    if not visual_session:
         return jsonify({'error':'Session not found'}), 404
 
-    session_data, correct = json.loads(row[0]), row[1]
-    # find selected items
-    card1 = next((p for p in session_data['pairs'] if p['id'] == id1), None)
-    card2 = next((p for p in session_data['pairs'] if p['id'] == id2), None)
-    if not card1 or not card2:
-        conn.close()
+    is_match = visual_session.check(data.get('id1'), data.get('id2'))
+    if is_match is None:
         return jsonify({'error':'Cards not found'}), 404
+    session_store.save(visual_session)
+
+    return jsonify({
+        'is_match': is_match,
+        'all_matched': visual_session.all_matched,
+        'correct_matches': visual_session.correct_matches,
+        'remaining': visual_session.card_count - len(visual_session.matched),
+    })
+
+@app.route('/visual/session/<session_id>', methods=['GET'])
+def get_visual_session(session_id):
+    """Full pair list with matched flags, e.g. to restore the board after a reload"""
+    if 'user_id' not in session:
+        return jsonify({'error':'Not logged in'}), 401
 
-    is_match = (card1['term_id'] == card2['term_id'] and card1['type'] != card2['type'])
-    if is_match:
-        for p in session_data['pairs']:
-            if p['term_id'] == card1['term_id']:
-                p['matched'] = True
-        correct += 1
-
-    # update view count and matches
-    c.execute('''
-        UPDATE visual_sessions
-        SET session_data = ?, cards_viewed = cards_viewed + 1, correct_matches = ?
-        WHERE id = ?
-    ''', (json.dumps(session_data), correct, session_id))
-    conn.commit()
-    conn.close()
-
-    all_matched = all(p.get('matched') for p in session_data['pairs'] if p['type']=='image')
-    return jsonify({'is_match': is_match, 'all_matched': all_matched, 'pairs': session_data['pairs']})
+    visual_session = session_store.get(session_id, session['user_id'])
+    if not visual_session:
+        return jsonify({'error':'Session not found'}), 404
+    return jsonify({'session_id': visual_session.id,
+                    'all_matched': visual_session.all_matched,
+                    'pairs': visual_session.pair_list()})
 
-@app.route('/visual/end/<int:session_id>', methods=['POST'])
+@app.route('/visual/end/<session_id>', methods=['POST'])
 def end_visual_session(session_id):
     if 'user_id' not in session:
         return jsonify({'error':'Not logged in'}), 401
 
-    conn = sqlite3.connect(DB_PATH)
+    visual_session = session_store.pop(session_id, session['user_id'])
+    if not visual_session:
+        return jsonify({'error':'Session not found'}), 404
+
+    # The only database write of the session: a compact summary row
+    init_visual_db()
+    conn = connect_sqlite(db_path())
     c = conn.cursor()
     c.execute('''
-        UPDATE visual_sessions
-        SET ended_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (session_id,))
+        INSERT INTO visual_sessions
+            (user_id, deck_id, cards_viewed, correct_matches, session_data, started_at, ended_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (visual_session.user_id, visual_session.deck_id, visual_session.cards_viewed,
+          visual_session.correct_matches, json.dumps(visual_session.summary()),
+          datetime.fromtimestamp(visual_session.started_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+    summary_id = c.lastrowid
     conn.commit()
     conn.close()
-    return jsonify({'message':'Session ended'})
+    return jsonify({'message':'Session ended', 'id': summary_id,
+                    'cards_viewed': visual_session.cards_viewed,
+                    'correct_matches': visual_session.correct_matches})
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,5 @@
+# wsgi.py
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import prepare_app
+
+app = prepare_app()